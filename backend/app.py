@@ -1,15 +1,36 @@
-from flask import Flask, jsonify
+from flask import Flask, jsonify, Response
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from models.models import db
-from utils.email_service import mail
+from utils.email_service import mail, outbox
+from utils.notifications import notifier
+from utils import stats
+from utils import auth as auth_utils
+from utils import database
+from utils import compression
+from utils import search
+from utils.log import configure_logging, init_request_timing
+from utils.metrics import metrics
+from utils.admission import admission
+from utils.replicas import replica_router
 from routes.auth import auth_bp
 from routes.todos import todos_bp
 from config import config
+from sqlalchemy import text
+import logging
 import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
 
 def create_app(config_name=None):
-    """Create Flask application"""
+    """Create Flask application
+
+    Touches neither the database nor the schema: run `python setup_db.py`
+    to create or upgrade it before starting workers.
+    """
+    started = time.perf_counter()
     app = Flask(__name__)
     
     # Load configuration
@@ -17,14 +38,27 @@ def create_app(config_name=None):
     app.config.from_object(config[config_name])
     
     # Initialize extensions
+    configure_logging(app)
     db.init_app(app)
+    replica_router.init_app(app)
+    database.init_app(app)
+    init_request_timing(app, db)
+    metrics.init_app(app, db)
     mail.init_app(app)
+    outbox.init_app(app)
+    notifier.init_app(app)
+    stats.init_app(app)
+    search.init_app(app)
+    auth_utils.init_app(app)
     jwt = JWTManager(app)
+    admission.init_app(app)
+    compression.init_app(app)
     
     # Configure CORS
     CORS(app, 
          origins=app.config['CORS_ORIGINS'],
          allow_headers=["Content-Type", "Authorization"],
+         expose_headers=["Retry-After"],
          methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
     
     # Register blueprints
@@ -34,17 +68,17 @@ def create_app(config_name=None):
     # JWT error handlers
     @jwt.expired_token_loader
     def expired_token_callback(jwt_header, jwt_payload):
-        print(f"🔍 JWT Debug: Token expired - Header: {jwt_header}, Payload: {jwt_payload}")
+        logger.debug('Expired token for user %s', jwt_payload.get('sub'))
         return jsonify({'error': 'Token has expired'}), 401
     
     @jwt.invalid_token_loader
     def invalid_token_callback(error):
-        print(f"🔍 JWT Debug: Invalid token - Error: {error}")
+        logger.debug('Invalid token: %s', error)
         return jsonify({'error': 'Invalid token'}), 401
     
     @jwt.unauthorized_loader
     def missing_token_callback(error):
-        print(f"🔍 JWT Debug: Missing token - Error: {error}")
+        logger.debug('Missing token: %s', error)
         return jsonify({'error': 'Authorization token is required'}), 401
     
     # General routes
@@ -65,7 +99,7 @@ def create_app(config_name=None):
         """Health check endpoint"""
         try:
             # Test database connection
-            db.session.execute('SELECT 1')
+            db.session.execute(text('SELECT 1'))
             db_status = 'healthy'
         except Exception as e:
             db_status = f'error: {str(e)}'
@@ -73,9 +107,15 @@ def create_app(config_name=None):
         return jsonify({
             'status': 'healthy',
             'database': db_status,
-            'environment': config_name
+            'environment': config_name,
+            'startup': app.extensions['startup']
         })
     
+    @app.route('/metrics')
+    def metrics_endpoint():
+        """Prometheus metrics, aggregated across workers"""
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+    
     # Error handlers
     @app.errorhandler(404)
     def not_found(error):
@@ -90,15 +130,28 @@ def create_app(config_name=None):
         db.session.rollback()
         return jsonify({'error': 'Internal server error'}), 500
     
-    # Create tables
-    with app.app_context():
-        db.create_all()
+    # Cold start figures, reported by /health; gunicorn.conf.py adds the worker's boot time
+    app.extensions['startup'] = {'pid': os.getpid(), 'create_app_seconds': round(time.perf_counter() - started, 4)}
+    logger.info('App created in %.3fs', app.extensions['startup']['create_app_seconds'])
     
     return app
 
-# Create app instance
-app = create_app()
+_app_lock = threading.Lock()
+
+def __getattr__(name):
+    # The module-level app (gunicorn's app:app, asgi.py) is created on first
+    # access, so scripts importing create_app do not build one they never use
+    if name != 'app':
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    with _app_lock:
+        if 'app' not in globals():
+            globals()['app'] = create_app()
+    return globals()['app']
 
 if __name__ == '__main__':
+    from utils.schema import init_schema
+    app = create_app()
+    # The development server creates or upgrades its own database
+    init_schema(app)
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=app.config['DEBUG'])
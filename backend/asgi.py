@@ -0,0 +1,59 @@
+"""
+ASGI entry point: the auth and todo routes as async views over an async
+SQLAlchemy engine (aiosqlite / asyncpg), with every other route served by
+the Flask app on a thread pool. Requires requirements-async.txt.
+
+    SERVER_MODE=asgi gunicorn -c gunicorn.conf.py
+    uvicorn asgi:app --reload
+"""
+from contextlib import asynccontextmanager
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.routing import Mount
+from app import app as flask_app
+from config import GUNICORN_THREADS
+from routes.async_auth import auth_routes
+from routes.async_todos import todo_routes
+from utils.async_db import async_db
+from utils.email_service import outbox
+from utils.notifications import notifier
+
+def create_asgi_app(app):
+    """Wrap a Flask app created by create_app() in the async routes"""
+    async_db.init_app(app)
+
+    @asynccontextmanager
+    async def lifespan(_):
+        yield
+        await async_db.dispose()
+        notifier.shutdown(timeout=5)
+        outbox.shutdown(timeout=5)
+
+    return Starlette(
+        routes=[
+            *auth_routes,
+            *todo_routes,
+            # Bulk, export, import, /health, /metrics, and 404/405 handling
+            Mount('/', WSGIMiddleware(app, workers=GUNICORN_THREADS)),
+        ],
+        middleware=[
+            # Same policy as Flask-CORS in create_app; answers preflights for both halves
+            Middleware(
+                CORSMiddleware,
+                allow_origins=app.config['CORS_ORIGINS'],
+                allow_headers=["Content-Type", "Authorization"],
+                allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+                expose_headers=["Retry-After"],
+            ),
+        ],
+        lifespan=lifespan,
+    )
+
+app = create_asgi_app(flask_app)
+
+if __name__ == '__main__':
+    import os
+    import uvicorn
+    uvicorn.run(app, host='0.0.0.0', port=int(os.environ.get('PORT', 5000)))
@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+"""
+API benchmark
+
+Seeds a dataset, drives every auth and todos route with concurrent clients
+and prints latency percentiles, requests/s and SQL statements per request
+as JSON, so runs can be diffed between commits:
+
+    python bench_api.py --output before.json
+    python bench_api.py --compare before.json --output after.json
+    python bench_api.py --users 10000 --todos 100 --large-users 3 --large-todos 100000
+
+The app is built with create_app('testing'); set TEST_DATABASE_URL to
+benchmark another database. Its tables are dropped and re-seeded unless
+--reuse is given.
+"""
+import argparse
+import collections
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+# Notification mail is suppressed under the testing config but still needs a sender
+os.environ.setdefault('MAIL_DEFAULT_SENDER', 'bench@example.com')
+
+from sqlalchemy import event, insert, select, func, text
+from app import create_app
+from models.models import db, User, Todo
+from utils.auth import generate_tokens
+from utils.email_service import outbox
+from utils.notifications import notifier
+from utils.pagination import encode_cursor
+from utils.passwords import hash_password
+from utils.schema import upgrade_schema
+from utils.search import install_search
+
+BENCH_PASSWORD = 'benchmark123'
+WORDS = ['report', 'groceries', 'deploy', 'review', 'invoice', 'meeting', 'refactor',
+         'backup', 'dentist', 'budget', 'release', 'garden', 'taxes', 'email', 'plan']
+PRIORITIES = ['low', 'medium', 'high']
+SEED_CHUNK = 10000
+
+# Statements executed by each thread, read before and after every request
+_queries = threading.local()
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    _queries.count = getattr(_queries, 'count', 0) + 1
+
+def _title(rng):
+    return ' '.join(rng.choice(WORDS) for _ in range(3))
+
+def _todo_rows(rng, user_id, count, now):
+    for _ in range(count):
+        created_at = now - timedelta(seconds=rng.randint(0, 365 * 86400))
+        completed = rng.random() < 0.4
+        due_date = created_at + timedelta(days=rng.randint(1, 60)) if rng.random() < 0.3 else None
+        yield {
+            'title': _title(rng),
+            'description': f'{_title(rng)} {_title(rng)}',
+            'priority': rng.choice(PRIORITIES),
+            'due_date': due_date,
+            'completed': completed,
+            'completed_at': created_at + timedelta(hours=1) if completed else None,
+            'created_at': created_at,
+            'updated_at': created_at,
+            'change_seq': 1,
+            'user_id': user_id,
+        }
+
+def _insert_chunked(model, rows):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= SEED_CHUNK:
+            db.session.execute(insert(model), chunk)
+            db.session.commit()
+            chunk = []
+    if chunk:
+        db.session.execute(insert(model), chunk)
+        db.session.commit()
+
+def seed(app, args):
+    """Recreate the schema and bulk-insert users and todos (one shared password hash)"""
+    rng = random.Random(args.seed)
+    now = datetime.utcnow()
+    with app.app_context():
+        db.drop_all()
+        if db.engine.dialect.name == 'sqlite':
+            with db.engine.begin() as conn:
+                conn.execute(text('DROP TABLE IF EXISTS todos_fts'))
+        db.create_all()
+        upgrade_schema()
+
+        password_hash = hash_password(BENCH_PASSWORD)
+        emails = [f'bench{i}@example.com' for i in range(args.users)]
+        emails += [f'bench-large{i}@example.com' for i in range(args.large_users)]
+        _insert_chunked(User, ({
+            'email': email, 'password_hash': password_hash,
+            'first_name': 'Bench', 'last_name': str(i),
+            'is_google_user': False, 'is_active': True,
+            'created_at': now, 'updated_at': now,
+            'todos_version': 1, 'todos_changed_at': now,
+        } for i, email in enumerate(emails)))
+
+        ids = dict(db.session.execute(select(User.email, User.id)).all())
+        def all_rows():
+            for i in range(args.users):
+                yield from _todo_rows(rng, ids[f'bench{i}@example.com'], args.todos, now)
+            for i in range(args.large_users):
+                yield from _todo_rows(rng, ids[f'bench-large{i}@example.com'], args.large_todos, now)
+        _insert_chunked(Todo, all_rows())
+    # Build the full-text index once over the seeded rows
+    install_search(app)
+
+class Context:
+    """Sampled users with tokens and todo ids that scenarios draw from"""
+
+    def __init__(self, app, args):
+        rng = random.Random(args.seed + 1)
+        self.user_count = args.users
+        self.register_ids = iter(range(10 ** 9))
+        self.lock = threading.Lock()
+        self.deletable = collections.deque()
+        self.users, self.large_users = [], []
+
+        with app.app_context():
+            regular = db.session.execute(
+                select(User.id).where(User.email.like('bench%@example.com'),
+                                      ~User.email.like('bench-%'))
+            ).scalars().all()
+            large = db.session.execute(
+                select(User.id).where(User.email.like('bench-large%'))
+            ).scalars().all()
+            for pool, target in [(rng.sample(regular, min(args.sample_users, len(regular))), self.users),
+                                 (large, self.large_users)]:
+                for user_id in pool:
+                    target.append(self._load_user(user_id))
+
+        # Each todo is deleted at most once; the rest stay for get/update
+        for user in self.users:
+            todo_ids = user['todo_ids']
+            split = max(1, len(todo_ids) // 2)
+            self.deletable.extend((user, todo_id) for todo_id in todo_ids[split:])
+            user['todo_ids'] = todo_ids[:split]
+        random.Random(args.seed + 2).shuffle(self.deletable)
+
+    def _load_user(self, user_id):
+        tokens = generate_tokens(user_id)
+        todo_ids = db.session.execute(
+            select(Todo.id).where(Todo.user_id == user_id).order_by(Todo.id).limit(200)
+        ).scalars().all()
+        middle = db.session.execute(
+            select(Todo.created_at, Todo.id).where(Todo.user_id == user_id)
+            .order_by(Todo.created_at.desc(), Todo.id.desc())
+            .offset(db.session.scalar(select(func.count(Todo.id)).where(Todo.user_id == user_id)) // 2)
+            .limit(1)
+        ).first()
+        return {
+            'id': user_id,
+            'headers': {'Authorization': f"Bearer {tokens['access_token']}"},
+            'refresh_headers': {'Authorization': f"Bearer {tokens['refresh_token']}"},
+            'todo_ids': todo_ids,
+            'cursor': encode_cursor(*middle) if middle else None,
+        }
+
+    def next_register_email(self):
+        with self.lock:
+            return f'bench-new{next(self.register_ids)}-{time.time_ns()}@example.com'
+
+def _ndjson_body(rng, count):
+    return '\n'.join(json.dumps({'title': _title(rng), 'priority': rng.choice(PRIORITIES)})
+                     for _ in range(count))
+
+# name -> (expected statuses, request builder); builders return client.open() kwargs
+def _scenarios():
+    def user(ctx, rng):
+        return rng.choice(ctx.users)
+
+    def large(ctx, rng):
+        return rng.choice(ctx.large_users)
+
+    def register(ctx, rng):
+        return dict(method='POST', path='/api/auth/register', json={
+            'email': ctx.next_register_email(), 'password': BENCH_PASSWORD,
+            'first_name': 'Bench', 'last_name': 'New'})
+
+    def login(ctx, rng):
+        return dict(method='POST', path='/api/auth/login', json={
+            'email': f"bench{rng.randrange(ctx.user_count)}@example.com", 'password': BENCH_PASSWORD})
+
+    def google(ctx, rng):
+        return dict(method='POST', path='/api/auth/google', json={'token': 'not-a-google-token'})
+
+    def delete(ctx, rng):
+        try:
+            owner, todo_id = ctx.deletable.popleft()
+        except IndexError:
+            return None
+        return dict(method='DELETE', path=f'/api/todos/{todo_id}', headers=owner['headers'])
+
+    def get(u, path, **kwargs):
+        return dict(method='GET', path=path, headers=u['headers'], **kwargs)
+
+    def bulk(ctx, rng):
+        u = user(ctx, rng)
+        operations = [{'op': 'create', 'title': _title(rng)} for _ in range(10)]
+        operations += [{'op': 'update', 'id': rng.choice(u['todo_ids']), 'priority': rng.choice(PRIORITIES)}
+                       for _ in range(5)]
+        operations += [{'op': 'complete', 'id': rng.choice(u['todo_ids']), 'completed': rng.random() < 0.5}
+                       for _ in range(5)]
+        return dict(method='POST', path='/api/todos/bulk', headers=u['headers'], json={'operations': operations})
+
+    ok = (200,)
+    return {
+        'auth.register': ((201,), register),
+        'auth.login': (ok, login),
+        'auth.google': ((401,), google),
+        'auth.refresh': (ok, lambda ctx, rng: dict(
+            method='POST', path='/api/auth/refresh', headers=user(ctx, rng)['refresh_headers'])),
+        'auth.me': (ok, lambda ctx, rng: get(user(ctx, rng), '/api/auth/me')),
+        'auth.logout': (ok, lambda ctx, rng: dict(
+            method='POST', path='/api/auth/logout', headers=user(ctx, rng)['headers'])),
+        'todos.list': (ok, lambda ctx, rng: get(user(ctx, rng), '/api/todos', query_string={
+            'page': rng.randint(1, 5)})),
+        'todos.list_filtered': (ok, lambda ctx, rng: get(user(ctx, rng), '/api/todos', query_string={
+            'completed': 'false', 'priority': rng.choice(PRIORITIES)})),
+        'todos.list_cursor': (ok, lambda ctx, rng: get(u := user(ctx, rng), '/api/todos', query_string={
+            'cursor': u['cursor'], 'per_page': 20})),
+        'todos.search': (ok, lambda ctx, rng: get(user(ctx, rng), '/api/todos', query_string={
+            'search': rng.choice(WORDS)[:4]})),
+        'todos.create': ((201,), lambda ctx, rng: dict(
+            method='POST', path='/api/todos', headers=user(ctx, rng)['headers'],
+            json={'title': _title(rng), 'priority': rng.choice(PRIORITIES)})),
+        'todos.bulk': (ok, bulk),
+        'todos.changes': (ok, lambda ctx, rng: get(user(ctx, rng), '/api/todos/changes')),
+        'todos.export_ndjson': (ok, lambda ctx, rng: get(user(ctx, rng), '/api/todos/export')),
+        'todos.export_csv_gzip': (ok, lambda ctx, rng: get(user(ctx, rng), '/api/todos/export', query_string={
+            'format': 'csv', 'gzip': '1'})),
+        'todos.import': (ok, lambda ctx, rng: dict(
+            method='POST', path='/api/todos/import', headers=user(ctx, rng)['headers'],
+            data=_ndjson_body(rng, 100), content_type='application/x-ndjson')),
+        'todos.get': (ok, lambda ctx, rng: get(u := user(ctx, rng), f"/api/todos/{rng.choice(u['todo_ids'])}")),
+        'todos.update': (ok, lambda ctx, rng: dict(
+            method='PUT', path=f"/api/todos/{rng.choice((u := user(ctx, rng))['todo_ids'])}",
+            headers=u['headers'], json={'priority': rng.choice(PRIORITIES), 'completed': rng.random() < 0.5})),
+        'todos.delete': (ok, delete),
+        'todos.stats': (ok, lambda ctx, rng: get(user(ctx, rng), '/api/todos/stats')),
+        'large.list': (ok, lambda ctx, rng: get(large(ctx, rng), '/api/todos', query_string={
+            'page': rng.randint(1, 50)})),
+        'large.list_cursor': (ok, lambda ctx, rng: get(u := large(ctx, rng), '/api/todos', query_string={
+            'cursor': u['cursor'], 'per_page': 20})),
+        'large.search': (ok, lambda ctx, rng: get(large(ctx, rng), '/api/todos', query_string={
+            'search': f'{rng.choice(WORDS)} {rng.choice(WORDS)[:3]}'})),
+        'large.stats': (ok, lambda ctx, rng: get(large(ctx, rng), '/api/todos/stats')),
+        'large.changes': (ok, lambda ctx, rng: get(large(ctx, rng), '/api/todos/changes', query_string={
+            'limit': 1000})),
+    }
+
+# Needs network access to GOOGLE_CERTS_URL, so only run when asked for
+OPT_IN_SCENARIOS = {'auth.google'}
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def run_scenario(app, ctx, name, expected, build, args):
+    """Run one scenario with args.concurrency clients; returns its summary"""
+    per_client = max(1, args.requests // args.concurrency)
+    barrier = threading.Barrier(args.concurrency + 1)
+    samples = []
+    samples_lock = threading.Lock()
+
+    def client_loop(index):
+        rng = random.Random(f'{args.seed}-{name}-{index}')
+        client = app.test_client()
+        local = []
+        for i in range(args.warmup + per_client):
+            if i == args.warmup:
+                barrier.wait()
+            kwargs = build(ctx, rng)
+            if kwargs is None:
+                continue
+            before = getattr(_queries, 'count', 0)
+            started = time.perf_counter()
+            response = client.open(**kwargs)
+            response.get_data()
+            elapsed = time.perf_counter() - started
+            response.close()
+            if i >= args.warmup:
+                local.append((elapsed, getattr(_queries, 'count', 0) - before, response.status_code))
+        with samples_lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=client_loop, args=(i,)) for i in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    latencies = sorted(sample[0] * 1000 for sample in samples)
+    queries = [sample[1] for sample in samples]
+    statuses = collections.Counter(str(sample[2]) for sample in samples)
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for sample in samples if sample[2] not in expected),
+        'statuses': dict(sorted(statuses.items())),
+        'requests_per_second': round(len(samples) / wall, 1) if wall else None,
+        'latency_ms': {
+            'p50': round(_percentile(latencies, 50), 3) if latencies else None,
+            'p95': round(_percentile(latencies, 95), 3) if latencies else None,
+            'p99': round(_percentile(latencies, 99), 3) if latencies else None,
+            'mean': round(sum(latencies) / len(latencies), 3) if latencies else None,
+        },
+        'queries_per_request': {
+            'mean': round(sum(queries) / len(queries), 2) if queries else None,
+            'max': max(queries) if queries else None,
+        },
+    }
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(base, current):
+    """Print p50/p95/requests-per-second changes against an earlier run"""
+    print(f"{'scenario':<24}{'p50 ms':>18}{'p95 ms':>18}{'req/s':>18}{'queries':>12}", file=sys.stderr)
+    for name, result in current['results'].items():
+        old = base['results'].get(name)
+        if not old:
+            continue
+        def cell(get):
+            before, after = get(old), get(result)
+            if before is None or after is None:
+                return '-'
+            change = f' ({(after - before) / before * 100:+.0f}%)' if before else ''
+            return f'{after:g}{change}'
+        print(f"{name:<24}"
+              f"{cell(lambda r: r['latency_ms']['p50']):>18}"
+              f"{cell(lambda r: r['latency_ms']['p95']):>18}"
+              f"{cell(lambda r: r['requests_per_second']):>18}"
+              f"{cell(lambda r: r['queries_per_request']['mean']):>12}", file=sys.stderr)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the TODO API')
+    parser.add_argument('--users', type=int, default=1000, help='regular users to seed')
+    parser.add_argument('--todos', type=int, default=100, help='todos per regular user')
+    parser.add_argument('--large-users', type=int, default=2, help='users with --large-todos todos each')
+    parser.add_argument('--large-todos', type=int, default=100000)
+    parser.add_argument('--sample-users', type=int, default=200, help='users the clients act as')
+    parser.add_argument('--concurrency', type=int, default=8, help='concurrent clients per scenario')
+    parser.add_argument('--requests', type=int, default=400, help='measured requests per scenario')
+    parser.add_argument('--warmup', type=int, default=5, help='unmeasured requests per client first')
+    parser.add_argument('--scenarios', help='comma-separated scenario names (default: all)')
+    parser.add_argument('--bcrypt-rounds', type=int, help='override the testing bcrypt cost')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--reuse', action='store_true', help='keep the existing dataset')
+    parser.add_argument('--output', help='write JSON here instead of stdout')
+    parser.add_argument('--compare', help='earlier JSON output to compare against')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    app = create_app('testing')
+    if args.bcrypt_rounds:
+        app.config['BCRYPT_ROUNDS'] = args.bcrypt_rounds
+
+    scenarios = _scenarios()
+    names = args.scenarios.split(',') if args.scenarios else [
+        name for name in scenarios if name not in OPT_IN_SCENARIOS]
+    unknown = [name for name in names if name not in scenarios]
+    if unknown:
+        sys.exit(f"Unknown scenarios: {', '.join(unknown)}. Available: {', '.join(scenarios)}")
+    if not args.large_users:
+        names = [name for name in names if not name.startswith('large.')]
+
+    if not args.reuse:
+        started = time.perf_counter()
+        print('Seeding...', file=sys.stderr)
+        seed(app, args)
+        print(f'Seeded in {time.perf_counter() - started:.1f}s', file=sys.stderr)
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', _count_query)
+        dialect = db.engine.dialect.name
+    ctx = Context(app, args)
+
+    results = {}
+    for name in names:
+        expected, build = scenarios[name]
+        print(f'Running {name}...', file=sys.stderr)
+        results[name] = run_scenario(app, ctx, name, expected, build, args)
+    notifier.shutdown(timeout=5)
+    outbox.shutdown(timeout=5)
+
+    report = {
+        'meta': {
+            'commit': _git_commit(),
+            'timestamp': datetime.utcnow().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'database': dialect,
+            'dataset': {'users': args.users, 'todos_per_user': args.todos,
+                        'large_users': args.large_users, 'large_todos': args.large_todos,
+                        'seed': args.seed},
+            'concurrency': args.concurrency,
+            'requests_per_scenario': args.requests,
+            'bcrypt_rounds': app.config['BCRYPT_ROUNDS'],
+        },
+        'results': results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,73 @@
 import os
+import tempfile
 from datetime import timedelta
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Gunicorn sizing (read by gunicorn.conf.py too): worker processes, threads per worker
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY') or 2)
+GUNICORN_THREADS = int(os.environ.get('GUNICORN_THREADS') or 4)
+# SERVER_MODE=asgi serves asgi:app on uvicorn workers instead of app:app on threads
+SERVER_MODE = (os.environ.get('SERVER_MODE') or 'wsgi').lower()
+# Async engine pool per ASGI worker: concurrent requests are not capped by threads
+ASGI_DB_POOL_SIZE = int(os.environ.get('ASGI_DB_POOL_SIZE') or 10)
+
+# Applied to every new SQLite connection (see utils/database.py). WAL lets
+# readers run alongside a writer; NORMAL sync is durable across app crashes
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE') or 256 * 1024 * 1024),
+    'cache_size': -int(os.environ.get('SQLITE_CACHE_KB') or 64 * 1024),
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS') or 5000),
+}
+
+def engine_options(database_uri, threads=GUNICORN_THREADS, background_threads=0, async_driver=False):
+    """SQLAlchemy engine options for a database URI, sized for one gunicorn worker
+
+    Each request thread holds at most one connection, so the pool matches
+    the thread count; overflow covers background threads (email outbox).
+    DB_MAX_CONNECTIONS, if set, caps pool + overflow across all workers.
+    async_driver gives connect_args for asyncpg / aiosqlite instead.
+    """
+    pool_size = int(os.environ.get('DB_POOL_SIZE') or threads)
+    max_overflow = int(os.environ.get('DB_MAX_OVERFLOW') or max(background_threads, 2))
+    max_connections = int(os.environ.get('DB_MAX_CONNECTIONS') or 0)
+    if max_connections:
+        per_worker = max(1, max_connections // WEB_CONCURRENCY)
+        pool_size = min(pool_size, per_worker)
+        max_overflow = max(0, min(max_overflow, per_worker - pool_size))
+    
+    options = {
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT') or 10),
+    }
+    if database_uri.startswith('postgresql'):
+        statement_timeout = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS') or 30000)
+        options.update({
+            # Replace connections the server or a proxy closed while idle
+            'pool_pre_ping': True,
+            'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE') or 1800),
+            'connect_args': {
+                'connect_timeout': int(os.environ.get('DB_CONNECT_TIMEOUT') or 10),
+                'options': f'-c statement_timeout={statement_timeout}',
+            },
+        })
+        if async_driver:
+            options['connect_args'] = {
+                'timeout': options['connect_args']['connect_timeout'],
+                'server_settings': {'statement_timeout': str(statement_timeout)},
+            }
+    elif database_uri.startswith('sqlite') and ':memory:' not in database_uri and database_uri != 'sqlite://':
+        # PRAGMA busy_timeout governs lock waits; don't let the driver's 5s default override it
+        options['connect_args'] = {'timeout': SQLITE_PRAGMAS['busy_timeout'] / 1000}
+    else:
+        # In-memory SQLite uses a single-connection pool
+        options = {}
+    return options
+
 class Config:
     # Basic Flask config
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
@@ -16,11 +80,28 @@ class Config:
     
     SQLALCHEMY_DATABASE_URI = DATABASE_URL or 'sqlite:///todoapp.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLITE_PRAGMAS = SQLITE_PRAGMAS
     
     # JWT config
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt-secret-change-in-production'
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=24)
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
+    # Embed is_active and profile fields in access tokens so protected routes
+    # skip the user lookup; changes take effect when the token is refreshed
+    JWT_USER_CLAIMS = os.environ.get('JWT_USER_CLAIMS', 'false').lower() in ['true', 'on', '1']
+    
+    # Password hashing: bcrypt cost (hashes with another cost are upgraded on
+    # login), executor size for the async routes, and how many hash/verify
+    # calls may be in flight (WSGI request threads hash in place)
+    BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS') or 12)
+    BCRYPT_MAX_WORKERS = int(os.environ.get('BCRYPT_MAX_WORKERS') or os.cpu_count() or 1)
+    BCRYPT_MAX_IN_FLIGHT = int(os.environ.get('BCRYPT_MAX_IN_FLIGHT') or BCRYPT_MAX_WORKERS * 4)
+    BCRYPT_QUEUE_TIMEOUT = float(os.environ.get('BCRYPT_QUEUE_TIMEOUT') or 2)
+    
+    # Authenticated-user cache (per worker; a hit is checked against the row's
+    # updated_at, so deactivation and profile changes apply on every worker)
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL') or 60)
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE') or 10000)
     
     # Email config
     MAIL_SERVER = os.environ.get('MAIL_SERVER') or 'smtp.gmail.com'
@@ -30,24 +111,167 @@ class Config:
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER') or MAIL_USERNAME
     
+    # Email outbox: bounded queue drained by a fixed pool of SMTP workers
+    MAIL_OUTBOX_WORKERS = int(os.environ.get('MAIL_OUTBOX_WORKERS') or 2)
+    MAIL_OUTBOX_MAXSIZE = int(os.environ.get('MAIL_OUTBOX_MAXSIZE') or 1000)
+    MAIL_OUTBOX_BATCH_SIZE = int(os.environ.get('MAIL_OUTBOX_BATCH_SIZE') or 50)
+    MAIL_OUTBOX_POLL_SECONDS = float(os.environ.get('MAIL_OUTBOX_POLL_SECONDS') or 30)
+    MAIL_MAX_RETRIES = int(os.environ.get('MAIL_MAX_RETRIES') or 5)
+    MAIL_RETRY_BACKOFF = float(os.environ.get('MAIL_RETRY_BACKOFF') or 2)
+    # Persist queued mail in the email_outbox table so it survives restarts
+    MAIL_OUTBOX_DURABLE = os.environ.get('MAIL_OUTBOX_DURABLE', 'false').lower() in ['true', 'on', '1']
+    MAIL_OUTBOX_STALE_SECONDS = int(os.environ.get('MAIL_OUTBOX_STALE_SECONDS') or 300)
+    # Durable outbox workers hold DB connections alongside request threads
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(
+        SQLALCHEMY_DATABASE_URI,
+        background_threads=MAIL_OUTBOX_WORKERS if MAIL_OUTBOX_DURABLE else 0
+    )
+    # Engine behind the async routes in asgi.py (the sync engine above still
+    # serves the routes they fall back to)
+    ASYNC_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI, threads=ASGI_DB_POOL_SIZE, async_driver=True)
+    
     # Google OAuth config
     GOOGLE_CLIENT_ID = os.environ.get('GOOGLE_CLIENT_ID')
     GOOGLE_CLIENT_SECRET = os.environ.get('GOOGLE_CLIENT_SECRET')
+    # Signing certs endpoint (cached per its Cache-Control max-age); override to test locally
+    GOOGLE_CERTS_URL = os.environ.get('GOOGLE_CERTS_URL') or 'https://www.googleapis.com/oauth2/v1/certs'
+    GOOGLE_HTTP_TIMEOUT = float(os.environ.get('GOOGLE_HTTP_TIMEOUT') or 10)
+    GOOGLE_HTTP_POOL_SIZE = int(os.environ.get('GOOGLE_HTTP_POOL_SIZE') or 10)
+    # Seconds a verified ID token is remembered (never beyond its exp)
+    GOOGLE_TOKEN_CACHE_TTL = int(os.environ.get('GOOGLE_TOKEN_CACHE_TTL') or 300)
+    
+    # Stats cache config (per worker; an entry is only used while the user's
+    # todos_version still matches, so writes made through any worker show)
+    STATS_CACHE_TTL = int(os.environ.get('STATS_CACHE_TTL') or 30)
+    STATS_CACHE_SIZE = int(os.environ.get('STATS_CACHE_SIZE') or 10000)
+    
+    # Maximum operations accepted by POST /api/todos/bulk
+    BULK_MAX_OPERATIONS = int(os.environ.get('BULK_MAX_OPERATIONS') or 500)
     
+    # GET /api/todos/export: rows fetched per server-side cursor batch, gzip level
+    EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE') or 1000)
+    EXPORT_GZIP_LEVEL = int(os.environ.get('EXPORT_GZIP_LEVEL') or 6)
+    
+    # Todo-creation emails: 'immediate' (one per todo), 'digest' (one summary
+    # per user per NOTIFICATION_WINDOW_SECONDS) or 'none'. Users can override
+    # the default with PUT /api/auth/preferences
+    NOTIFICATION_DEFAULT_MODE = os.environ.get('NOTIFICATION_DEFAULT_MODE') or 'digest'
+    NOTIFICATION_WINDOW_SECONDS = float(os.environ.get('NOTIFICATION_WINDOW_SECONDS') or 300)
+    NOTIFICATION_DIGEST_MAX_ITEMS = int(os.environ.get('NOTIFICATION_DIGEST_MAX_ITEMS') or 50)
+    
+    # Due-date reminders (reminder_worker.py): every REMINDER_INTERVAL_SECONDS,
+    # todos due within REMINDER_DUE_SOON_HOURS or newly overdue are mailed as
+    # one digest per user. Each run scans at most REMINDER_MAX_PER_RUN todos,
+    # REMINDER_BATCH_SIZE at a time, and waits up to REMINDER_ENQUEUE_TIMEOUT
+    # seconds for room in the email outbox
+    REMINDER_INTERVAL_SECONDS = float(os.environ.get('REMINDER_INTERVAL_SECONDS') or 300)
+    REMINDER_DUE_SOON_HOURS = float(os.environ.get('REMINDER_DUE_SOON_HOURS') or 24)
+    REMINDER_BATCH_SIZE = int(os.environ.get('REMINDER_BATCH_SIZE') or 1000)
+    REMINDER_MAX_PER_RUN = int(os.environ.get('REMINDER_MAX_PER_RUN') or 50000)
+    REMINDER_DIGEST_MAX_ITEMS = int(os.environ.get('REMINDER_DIGEST_MAX_ITEMS') or 50)
+    REMINDER_ENQUEUE_TIMEOUT = float(os.environ.get('REMINDER_ENQUEUE_TIMEOUT') or 60)
+    
+    # Delta sync: deleted todos' tombstones are kept TOMBSTONE_RETENTION_DAYS
+    # (reminder_worker.py purges them); a sync cursor older than the purged
+    # tombstones gets 410 and the client must sync from scratch
+    TOMBSTONE_RETENTION_DAYS = float(os.environ.get('TOMBSTONE_RETENTION_DAYS') or 30)
+    
+    # Response compression negotiated by Accept-Encoding: zstd and br are
+    # offered when zstandard / brotli are installed, gzip always. Buffered
+    # bodies under COMPRESS_MIN_SIZE bytes are not worth compressing
+    COMPRESS_ENABLED = os.environ.get('COMPRESS_ENABLED', 'true').lower() in ['true', 'on', '1']
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE') or 1024)
+    COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL') or 6)  # gzip, 1-9
+    COMPRESS_BR_LEVEL = int(os.environ.get('COMPRESS_BR_LEVEL') or 4)  # brotli, 0-11
+    COMPRESS_ZSTD_LEVEL = int(os.environ.get('COMPRESS_ZSTD_LEVEL') or 3)  # zstd, 1-22
+    COMPRESS_MIMETYPES = ['application/json', 'application/x-ndjson', 'text/csv', 'text/plain', 'text/html']
+    
+    # Todo import: rows per committed batch, and how many row errors to report
+    IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE') or 1000)
+    IMPORT_MAX_ERRORS = int(os.environ.get('IMPORT_MAX_ERRORS') or 100)
+    
+    # Logging: format is 'json' or 'text'; LOG_LEVELS overrides per logger,
+    # e.g. 'routes.todos=DEBUG,utils.email_service=WARNING'
+    LOG_FORMAT = os.environ.get('LOG_FORMAT') or 'json'
+    LOG_LEVEL = (os.environ.get('LOG_LEVEL') or 'INFO').upper()
+    LOG_LEVELS = os.environ.get('LOG_LEVELS') or ''
+    # Fraction of requests logged with total / DB / serialization timings
+    LOG_REQUEST_SAMPLE_RATE = float(os.environ.get('LOG_REQUEST_SAMPLE_RATE') or 0)
+    
+    # Shared directory where each worker publishes its metrics for /metrics
+    # to aggregate; unset reports only the worker that serves the scrape
+    METRICS_DIR = os.environ.get('METRICS_DIR')
+    METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL') or 1)
+    
+    # Admission control: requests over a client's rate (token bucket keyed by
+    # JWT identity, else IP) or concurrency limit get 429; beyond the global
+    # in-flight limit a request waits up to ADMISSION_QUEUE_TIMEOUT seconds
+    # (at most ADMISSION_MAX_QUEUE waiting per worker), then gets 503
+    ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', 'true').lower() in ['true', 'on', '1']
+    # 'memory' limits each worker separately; 'sqlite:///path' shares limits across workers
+    ADMISSION_STORE = os.environ.get('ADMISSION_STORE') or 'memory'
+    # Defaults to the request threads available; set it lower to keep headroom for the database
+    ADMISSION_GLOBAL_IN_FLIGHT = int(os.environ.get('ADMISSION_GLOBAL_IN_FLIGHT') or GUNICORN_THREADS * (
+        1 if ADMISSION_STORE == 'memory' else WEB_CONCURRENCY
+    ))
+    ADMISSION_CLIENT_IN_FLIGHT = int(os.environ.get('ADMISSION_CLIENT_IN_FLIGHT') or 4)
+    ADMISSION_USER_RATE = float(os.environ.get('ADMISSION_USER_RATE') or 20)
+    ADMISSION_USER_BURST = float(os.environ.get('ADMISSION_USER_BURST') or 40)
+    ADMISSION_IP_RATE = float(os.environ.get('ADMISSION_IP_RATE') or 10)
+    ADMISSION_IP_BURST = float(os.environ.get('ADMISSION_IP_BURST') or 20)
+    ADMISSION_QUEUE_TIMEOUT = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT') or 0.25)
+    ADMISSION_MAX_QUEUE = int(os.environ.get('ADMISSION_MAX_QUEUE') or GUNICORN_THREADS * 4)
+    # Seconds before a slot held by a crashed worker is reclaimed (SQLite store)
+    ADMISSION_SLOT_TTL = int(os.environ.get('ADMISSION_SLOT_TTL') or 60)
+    # Key anonymous clients by the first X-Forwarded-For address (only behind a trusted proxy)
+    ADMISSION_TRUST_PROXY = os.environ.get('ADMISSION_TRUST_PROXY', 'false').lower() in ['true', 'on', '1']
+
+    # Read replicas (comma-separated URLs): GET requests read from one of them,
+    # unless their user wrote within REPLICA_PIN_SECONDS (keep it above the
+    # replication lag); everything else uses the primary. Pins are kept in
+    # REPLICA_PIN_STORE, 'memory' or 'sqlite:///path' as for ADMISSION_STORE
+    REPLICA_DATABASE_URLS = [
+        url.strip().replace('postgres://', 'postgresql://', 1)
+        for url in (os.environ.get('REPLICA_DATABASE_URLS') or '').split(',') if url.strip()
+    ]
+    SQLALCHEMY_BINDS = {
+        f'replica{i}': {'url': url, **engine_options(url)} for i, url in enumerate(REPLICA_DATABASE_URLS)
+    }
+    REPLICA_PIN_SECONDS = float(os.environ.get('REPLICA_PIN_SECONDS') or 5)
+    # Every worker must see every pin: with several workers and a 'memory'
+    # ADMISSION_STORE, pins default to a SQLite file shared on this host
+    WEB_CONCURRENCY = WEB_CONCURRENCY
+    REPLICA_PIN_STORE = os.environ.get('REPLICA_PIN_STORE') or (
+        ADMISSION_STORE if ADMISSION_STORE != 'memory' or WEB_CONCURRENCY == 1 or not REPLICA_DATABASE_URLS
+        else 'sqlite:///' + os.path.join(tempfile.gettempdir(), 'todoapp-replica-pins.db')
+    )
+
     # CORS config
     CORS_ORIGINS = os.environ.get('CORS_ORIGINS', 'http://localhost:3000').split(',')
 
 class DevelopmentConfig(Config):
     DEBUG = True
+    LOG_FORMAT = os.environ.get('LOG_FORMAT') or 'text'
+    LOG_REQUEST_SAMPLE_RATE = float(os.environ.get('LOG_REQUEST_SAMPLE_RATE') or 1)
     SQLALCHEMY_DATABASE_URI = os.environ.get('DEV_DATABASE_URL') or \
         'sqlite:///todoapp_dev.db'
+    # The dev server runs one thread per request, so keep a modest pool
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI, threads=5)
+    ASYNC_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI, threads=ASGI_DB_POOL_SIZE, async_driver=True)
 
 class ProductionConfig(Config):
     DEBUG = False
 
 class TestingConfig(Config):
     TESTING = True
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///todoapp_test.db'
+    BCRYPT_ROUNDS = 4
+    SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URL') or \
+        'sqlite:///todoapp_test.db'
+    # Sized for bench_api.py's concurrent in-process clients
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI, threads=32)
+    ASYNC_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI, threads=32, async_driver=True)
+    # Benchmarks drive far more traffic per user than any real client
+    ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', 'false').lower() in ['true', 'on', '1']
 
 config = {
     'development': DevelopmentConfig,
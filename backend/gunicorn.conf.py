@@ -0,0 +1,60 @@
+"""
+Gunicorn settings; worker and thread counts come from config.py so the
+database pool is sized to match (see config.engine_options)
+
+SERVER_MODE picks the app: 'wsgi' (default) serves app:app on gthread
+workers, 'asgi' serves asgi:app on uvicorn workers (requirements-async.txt)
+"""
+import os
+import time
+from config import WEB_CONCURRENCY, GUNICORN_THREADS, SERVER_MODE
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = WEB_CONCURRENCY
+if SERVER_MODE == 'asgi':
+    wsgi_app = 'asgi:app'
+    worker_class = 'uvicorn_worker.UvicornWorker'
+else:
+    wsgi_app = 'app:app'
+    threads = GUNICORN_THREADS
+    worker_class = 'gthread' if GUNICORN_THREADS > 1 else 'sync'
+timeout = int(os.environ.get('GUNICORN_TIMEOUT') or 30)
+keepalive = 5
+# Recycle workers now and then to bound memory growth
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS') or 1000)
+max_requests_jitter = 100
+preload_app = os.environ.get('GUNICORN_PRELOAD', '').lower() in ('1', 'true', 'yes')
+
+def post_fork(server, worker):
+    worker.boot_started = time.perf_counter()
+    if server.cfg.preload_app:
+        # Connections opened by the master must not be shared with the worker;
+        # close=False leaves them to the master, the worker opens its own
+        from app import app
+        from models.models import db
+        with app.app_context():
+            engines = list(db.engines.values())
+        async_db = app.extensions.get('async_db')
+        if async_db is not None:
+            engines += [engine.sync_engine for engine in (async_db.engine, *async_db.replica_engines.values())]
+        for engine in engines:
+            engine.dispose(close=False)
+
+def post_worker_init(worker):
+    from app import app
+    from utils.metrics import metrics
+    seconds = time.perf_counter() - worker.boot_started
+    app.extensions['startup'].update(pid=os.getpid(), worker_boot_seconds=round(seconds, 4))
+    metrics.observe_worker_boot(seconds)
+    worker.log.info('Worker %s booted in %.3fs', os.getpid(), seconds)
+
+def worker_exit(server, worker):
+    # Buffered notification digests and queued mail live in the worker: send
+    # them before it goes (max_requests recycles workers routinely)
+    from utils.notifications import notifier
+    from utils.email_service import outbox
+    notifier.shutdown(timeout=10)
+    outbox.shutdown(timeout=10)
+    # Counts since the last flush would otherwise never reach METRICS_DIR
+    from utils.metrics import metrics
+    metrics.flush()
@@ -1,8 +1,11 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import object_session
 from datetime import datetime
-import bcrypt
+from utils.passwords import hash_password, verify_password, needs_rehash
+from utils.replicas import RoutingSession
 
-db = SQLAlchemy()
+# Reads of GET requests may go to a read replica (see utils/replicas.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -19,8 +22,19 @@ class User(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    # Relationship with todos
-    todos = db.relationship('Todo', backref='user', lazy=True, cascade='all, delete-orphan')
+    # Bumped on every write to the user's todos; drives collection ETags
+    todos_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    todos_changed_at = db.Column(db.DateTime, nullable=True)
+    # Delta sync cursors behind this change_seq have expired: the tombstones
+    # they still needed were purged (see utils.tombstones)
+    todos_sync_horizon = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
+    # Todo-creation emails: immediate, digest or none (NULL: NOTIFICATION_DEFAULT_MODE)
+    notification_mode = db.Column(db.String(20), nullable=True)
+    
+    # Relationship with todos (dynamic: a query, never a fully loaded collection)
+    todos = db.relationship('Todo', backref='user', lazy='dynamic', cascade='all, delete-orphan')
+    todo_tombstones = db.relationship('TodoTombstone', lazy='dynamic', cascade='all, delete-orphan')
     
     def __init__(self, email, first_name, last_name, password=None, is_google_user=False, google_id=None, profile_picture=None):
         self.email = email
@@ -34,17 +48,17 @@ class User(db.Model):
     
     def set_password(self, password):
         """Hash and set password"""
-        password_bytes = password.encode('utf-8')
-        salt = bcrypt.gensalt()
-        self.password_hash = bcrypt.hashpw(password_bytes, salt).decode('utf-8')
+        self.password_hash = hash_password(password)
     
     def check_password(self, password):
         """Check if provided password matches hash"""
         if not self.password_hash:
             return False
-        password_bytes = password.encode('utf-8')
-        hash_bytes = self.password_hash.encode('utf-8')
-        return bcrypt.checkpw(password_bytes, hash_bytes)
+        return verify_password(password, self.password_hash)
+    
+    def password_needs_rehash(self):
+        """True when the stored hash uses a different bcrypt cost than configured"""
+        return bool(self.password_hash) and needs_rehash(self.password_hash)
     
     def to_dict(self):
         """Convert user to dictionary for JSON response"""
@@ -57,15 +71,33 @@ class User(db.Model):
             'is_google_user': self.is_google_user,
             'profile_picture': self.profile_picture,
             'created_at': self.created_at.isoformat(),
-            'todo_count': len(self.todos)
+            'todo_count': self.todo_count()
         }
     
+    def todo_count(self):
+        """Count the user's todos with a single COUNT query (index-only on user_id)"""
+        # The user's own session, so this also works under AsyncSession.run_sync
+        session = object_session(self) or db.session
+        return session.query(db.func.count(Todo.id)).filter(Todo.user_id == self.id).scalar()
+    
     def __repr__(self):
         return f'<User {self.email}>'
 
 
 class Todo(db.Model):
     __tablename__ = 'todos'
+    __table_args__ = (
+        # Default listing / keyset pagination: newest first per user
+        db.Index('ix_todos_user_created', 'user_id', 'created_at', 'id'),
+        # Listing filtered by completed (and optionally priority)
+        db.Index('ix_todos_user_completed_priority_created', 'user_id', 'completed', 'priority', 'created_at'),
+        # Listing filtered by priority only
+        db.Index('ix_todos_user_priority_created', 'user_id', 'priority', 'created_at'),
+        # Delta sync: changes after a (change_seq, id) cursor
+        db.Index('ix_todos_user_change_seq', 'user_id', 'change_seq', 'id'),
+        # Reminder scans: pending todos by due date, bounded by (due_date, id)
+        db.Index('ix_todos_completed_due', 'completed', 'due_date', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
@@ -76,6 +108,10 @@ class Todo(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     completed_at = db.Column(db.DateTime, nullable=True)
+    # User's todos_version at the todo's last write (see utils.versioning)
+    change_seq = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # due_date the due-soon reminder was last sent for (see utils.reminders)
+    reminded_due_date = db.Column(db.DateTime, nullable=True)
     
     # Foreign key to user
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -114,3 +150,62 @@ class Todo(db.Model):
     
     def __repr__(self):
         return f'<Todo {self.title}>'
+
+
+class TodoTombstone(db.Model):
+    """Record of a deleted todo, so delta sync clients learn about deletions"""
+    __tablename__ = 'todo_tombstones'
+    __table_args__ = (
+        db.Index('ix_todo_tombstones_user_change_seq', 'user_id', 'change_seq', 'todo_id'),
+        # Retention purge: tombstones older than TOMBSTONE_RETENTION_DAYS
+        db.Index('ix_todo_tombstones_deleted_at', 'deleted_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    todo_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    change_seq = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        """Convert tombstone to dictionary for JSON response"""
+        return {
+            'id': self.todo_id,
+            'deleted_at': self.deleted_at.isoformat()
+        }
+    
+    def __repr__(self):
+        return f'<TodoTombstone {self.todo_id}>'
+
+
+class ReminderState(db.Model):
+    """High-water mark of a reminder pass: the (due_date, id) of the last todo it covered"""
+    __tablename__ = 'reminder_state'
+    
+    name = db.Column(db.String(20), primary_key=True)  # overdue
+    due_date = db.Column(db.DateTime, nullable=False)
+    todo_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<ReminderState {self.name} {self.due_date} {self.todo_id}>'
+
+
+class OutboxMessage(db.Model):
+    """Queued email persisted so it survives a worker restart (MAIL_OUTBOX_DURABLE)"""
+    __tablename__ = 'email_outbox'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    subject = db.Column(db.String(255), nullable=False)
+    sender = db.Column(db.String(255), nullable=True)
+    recipients = db.Column(db.Text, nullable=False)  # comma-separated
+    body = db.Column(db.Text, nullable=True)
+    html = db.Column(db.Text, nullable=True)
+    status = db.Column(db.String(20), default='pending', index=True)  # pending, sending, failed
+    attempts = db.Column(db.Integer, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<OutboxMessage {self.id} {self.status}>'
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Due-date reminder worker
+
+Every REMINDER_INTERVAL_SECONDS, mails each user one digest of their todos
+that became overdue or came due within REMINDER_DUE_SOON_HOURS since the
+previous run (see utils/reminders.py), and purges the tombstones of todos
+deleted more than TOMBSTONE_RETENTION_DAYS ago (utils/tombstones.py). Run
+a single instance next to the web workers, against the same database and
+mail settings:
+
+    python reminder_worker.py
+    python reminder_worker.py --once
+"""
+import argparse
+import logging
+import signal
+import threading
+from app import create_app
+from utils.email_service import outbox
+from utils.reminders import run_reminders
+from utils.tombstones import purge_tombstones
+
+logger = logging.getLogger('reminders')
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--once', action='store_true', help='run once and exit')
+    parser.add_argument('--interval', type=float, help='seconds between runs (default REMINDER_INTERVAL_SECONDS)')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    app = create_app()
+    interval = args.interval or app.config['REMINDER_INTERVAL_SECONDS']
+
+    stop = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: stop.set())
+
+    try:
+        while not stop.is_set():
+            summary = None
+            with app.app_context():
+                try:
+                    summary = run_reminders()
+                    logger.info('Reminder run', extra=summary)
+                except Exception:
+                    logger.exception('Reminder run failed')
+                try:
+                    purged = purge_tombstones()
+                    if purged:
+                        logger.info('Purged expired tombstones', extra={'tombstones': purged})
+                except Exception:
+                    logger.exception('Tombstone purge failed')
+            if args.once:
+                break
+            # A run that hit REMINDER_MAX_PER_RUN continues right away
+            if not (summary and summary['capped']):
+                stop.wait(interval)
+    finally:
+        # Deliver the digests still queued before exiting
+        outbox.shutdown(timeout=30)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+import asyncio
+import logging
+from flask import request, jsonify
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import select
+from starlette.routing import Route
+from models.models import User
+from routes.auth import _server_busy
+from utils.async_db import async_db
+from utils.auth import generate_tokens, user_claims, validate_email, validate_password, async_jwt_required
+from utils.google_auth import verify_google_token
+from utils.email_service import send_welcome_email
+from utils.passwords import PasswordHasherBusy, hash_password_async, verify_password_async, needs_rehash
+
+# Async counterparts of routes/auth.py for asgi.py: bcrypt runs on the
+# password executor and Google verification / email hand-off on threads,
+# so none of them holds up other requests on the event loop
+
+logger = logging.getLogger(__name__)
+
+async def _find_user(session, email):
+    return await session.scalar(select(User).filter_by(email=email).limit(1))
+
+async def _user_dict(session, user):
+    # to_dict() runs the todo COUNT on the user's session
+    return await session.run_sync(lambda sync_session: user.to_dict())
+
+async def register(session):
+    """Register a new user"""
+    try:
+        data = request.get_json()
+        
+        # Validate required fields
+        required_fields = ['email', 'password', 'first_name', 'last_name']
+        for field in required_fields:
+            if not data.get(field):
+                return jsonify({'error': f'{field} is required'}), 400
+        
+        email = data['email'].lower().strip()
+        password = data['password']
+        first_name = data['first_name'].strip()
+        last_name = data['last_name'].strip()
+        
+        # Validate email format
+        if not validate_email(email):
+            return jsonify({'error': 'Invalid email format'}), 400
+        
+        # Validate password strength
+        is_valid, message = validate_password(password)
+        if not is_valid:
+            return jsonify({'error': message}), 400
+        
+        # Check if user already exists
+        if await _find_user(session, email):
+            return jsonify({'error': 'User with this email already exists'}), 409
+        
+        # Create new user
+        user = User(email=email, first_name=first_name, last_name=last_name)
+        user.password_hash = await hash_password_async(password)
+        
+        async with async_db.writer():
+            session.add(user)
+            await session.commit()
+        
+        # Generate tokens
+        tokens = generate_tokens(user.id, user_claims(user))
+        
+        # Send welcome email
+        await asyncio.to_thread(send_welcome_email, user.email, user.first_name)
+        
+        return jsonify({
+            'message': 'User registered successfully',
+            'user': await _user_dict(session, user),
+            **tokens
+        }), 201
+        
+    except PasswordHasherBusy:
+        await session.rollback()
+        return _server_busy()
+    except Exception:
+        await session.rollback()
+        logger.exception("Registration error")
+        return jsonify({'error': 'Registration failed'}), 500
+
+async def login(session):
+    """Login user with email and password"""
+    try:
+        data = request.get_json()
+        
+        email = data.get('email', '').lower().strip()
+        password = data.get('password', '')
+        
+        if not email or not password:
+            return jsonify({'error': 'Email and password are required'}), 400
+        
+        # Find user by email
+        user = await _find_user(session, email)
+        
+        if not user or not user.password_hash or not await verify_password_async(password, user.password_hash):
+            return jsonify({'error': 'Invalid email or password'}), 401
+        
+        if not user.is_active:
+            return jsonify({'error': 'Account is deactivated'}), 401
+        
+        # Transparently move the stored hash to the configured bcrypt cost
+        if needs_rehash(user.password_hash):
+            user.password_hash = await hash_password_async(password)
+            async with async_db.writer():
+                await session.commit()
+        
+        # Generate tokens
+        tokens = generate_tokens(user.id, user_claims(user))
+        
+        return jsonify({
+            'message': 'Login successful',
+            'user': await _user_dict(session, user),
+            **tokens
+        }), 200
+        
+    except PasswordHasherBusy:
+        await session.rollback()
+        return _server_busy()
+    except Exception:
+        await session.rollback()
+        logger.exception("Login error")
+        return jsonify({'error': 'Login failed'}), 500
+
+async def google_login(session):
+    """Login/Register user with Google OAuth"""
+    try:
+        data = request.get_json()
+        token = data.get('token')
+        
+        if not token:
+            return jsonify({'error': 'Google token is required'}), 400
+        
+        # Verify Google token and get user info
+        user_info = await asyncio.to_thread(verify_google_token, token)
+        
+        if not user_info:
+            return jsonify({'error': 'Invalid Google token'}), 401
+        
+        email = user_info['email'].lower()
+        
+        # Check if user exists
+        user = await _find_user(session, email)
+        
+        if user:
+            # Update existing user with Google info if not already a Google user
+            if not user.is_google_user:
+                user.is_google_user = True
+                user.google_id = user_info['google_id']
+                user.profile_picture = user_info['profile_picture']
+                async with async_db.writer():
+                    await session.commit()
+        else:
+            # Create new user from Google info
+            user = User(
+                email=email,
+                first_name=user_info['first_name'],
+                last_name=user_info['last_name'],
+                is_google_user=True,
+                google_id=user_info['google_id'],
+                profile_picture=user_info['profile_picture']
+            )
+            
+            async with async_db.writer():
+                session.add(user)
+                await session.commit()
+            
+            # Send welcome email to new users
+            await asyncio.to_thread(send_welcome_email, user.email, user.first_name)
+        
+        if not user.is_active:
+            return jsonify({'error': 'Account is deactivated'}), 401
+        
+        # Generate tokens
+        tokens = generate_tokens(user.id, user_claims(user))
+        
+        return jsonify({
+            'message': 'Google login successful',
+            'user': await _user_dict(session, user),
+            **tokens
+        }), 200
+        
+    except Exception:
+        await session.rollback()
+        logger.exception("Google login error")
+        return jsonify({'error': 'Google login failed'}), 500
+
+@async_jwt_required(refresh=True)
+async def refresh(session):
+    """Refresh access token"""
+    try:
+        user = await session.get(User, int(get_jwt_identity()))
+        
+        if not user or not user.is_active:
+            return jsonify({'error': 'User not found or inactive'}), 404
+        
+        # Generate new access token
+        tokens = generate_tokens(user.id, user_claims(user))
+        
+        return jsonify({
+            'message': 'Token refreshed successfully',
+            'user': await _user_dict(session, user),
+            **tokens
+        }), 200
+        
+    except Exception:
+        logger.exception("Token refresh error")
+        return jsonify({'error': 'Token refresh failed'}), 500
+
+@async_jwt_required()
+async def get_current_user_info(session):
+    """Get current user information"""
+    current_user = await session.get(User, int(get_jwt_identity()))
+    if not current_user:
+        return jsonify({'error': 'User not found'}), 404
+    
+    return jsonify({
+        'user': await _user_dict(session, current_user)
+    }), 200
+
+@async_jwt_required()
+async def logout(session):
+    """Logout user (client should remove tokens)"""
+    return jsonify({'message': 'Logout successful'}), 200
+
+auth_routes = [
+    Route('/api/auth/register', async_db.view(register), methods=['POST']),
+    Route('/api/auth/login', async_db.view(login), methods=['POST']),
+    Route('/api/auth/google', async_db.view(google_login), methods=['POST']),
+    Route('/api/auth/refresh', async_db.view(refresh), methods=['POST']),
+    Route('/api/auth/me', async_db.view(get_current_user_info), methods=['GET']),
+    Route('/api/auth/logout', async_db.view(logout), methods=['POST']),
+]
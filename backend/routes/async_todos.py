@@ -0,0 +1,271 @@
+import logging
+from flask import request, jsonify
+from sqlalchemy import select
+from starlette.routing import Route
+from models.models import Todo, TodoTombstone
+from utils.async_db import async_db
+from utils.auth import async_jwt_required_with_user
+from utils.notifications import notifier
+from utils.stats import load_todo_stats, invalidate_todo_stats
+from utils.validation import validate_new_todo, validate_todo_changes
+from utils.versioning import bump_todos_version, get_todos_version
+from utils.http_cache import make_etag, request_args_key, is_conditional, is_not_modified, with_validators, not_modified
+from utils.serializers import todo_row_to_dict
+from utils.pagination import decode_sync_cursor, InvalidCursor, paginate_rows
+from utils.todo_queries import (
+    todo_list_statements, cursor_page_statement, cursor_page, todo_changes_statements, todo_changes,
+    sync_horizon_statement, sync_cursor_expired
+)
+
+# Async counterparts of routes/todos.py for asgi.py. Bulk, export and import
+# are not ported: asgi.py hands them to the Flask app on a worker thread
+
+logger = logging.getLogger(__name__)
+
+async def _bump_todos_version(session, user_id):
+    return await session.run_sync(lambda sync_session: bump_todos_version(user_id, sync_session))
+
+async def _find_todo(session, user_id, todo_id):
+    return await session.scalar(select(Todo).filter_by(id=todo_id, user_id=user_id).limit(1))
+
+@async_jwt_required_with_user
+async def get_todos(session, current_user):
+    """Get all todos for current user"""
+    try:
+        # Get query parameters
+        page = request.args.get('page', 1, type=int)
+        per_page = min(request.args.get('per_page', 10, type=int), 100)
+        completed = request.args.get('completed')
+        priority = request.args.get('priority')
+        search = request.args.get('search', '').strip()
+        cursor = request.args.get('cursor')
+        
+        # Conditional GET: answer from the collection version alone
+        version, changed_at = await session.run_sync(
+            lambda sync_session: get_todos_version(current_user.id, sync_session)
+        )
+        etag = make_etag('todos', current_user.id, version, request_args_key())
+        if is_not_modified(etag, changed_at):
+            return not_modified(etag, changed_at)
+        
+        query, count_query = todo_list_statements(
+            current_user.id, completed, priority, search, ranked=cursor is None
+        )
+        
+        # Cursor mode: keyset pagination on (created_at, id), no COUNT
+        if cursor is not None:
+            try:
+                statement = cursor_page_statement(query, cursor, per_page)
+            except InvalidCursor:
+                return jsonify({'error': 'Invalid cursor'}), 400
+            rows = (await session.execute(statement)).all()
+            return with_validators((jsonify(cursor_page(rows, per_page)), 200), etag, changed_at)
+        
+        # Order by created_at desc
+        query = query.order_by(Todo.created_at.desc(), Todo.id.desc())
+        
+        # Paginate
+        rows, pagination = await session.run_sync(paginate_rows, query, count_query, page, per_page)
+        
+        return with_validators((jsonify({
+            'todos': [todo_row_to_dict(row) for row in rows],
+            'pagination': {
+                'page': page,
+                'per_page': per_page,
+                **pagination
+            }
+        }), 200), etag, changed_at)
+        
+    except Exception:
+        logger.exception("Error getting todos")
+        return jsonify({'error': 'Failed to get todos'}), 500
+
+@async_jwt_required_with_user
+async def create_todo(session, current_user):
+    """Create a new todo"""
+    try:
+        data = request.get_json()
+        
+        fields, error = validate_new_todo(data)
+        if error:
+            return jsonify({'error': error}), 400
+        
+        # Create todo
+        todo = Todo(user_id=current_user.id, **fields)
+        async with async_db.writer():
+            todo.change_seq = await _bump_todos_version(session, current_user.id)
+            
+            session.add(todo)
+            await session.commit()
+        # Respond with the stored values, as the expired WSGI instance would
+        await session.refresh(todo)
+        invalidate_todo_stats(current_user.id)
+        
+        # Queue the email notification (sent alone or in a digest, per the user's preference)
+        notifier.todo_created(current_user, todo.title, todo.description)
+        
+        return jsonify({
+            'message': 'Todo created successfully',
+            'todo': todo.to_dict()
+        }), 201
+        
+    except Exception:
+        await session.rollback()
+        logger.exception("Error creating todo")
+        return jsonify({'error': 'Failed to create todo'}), 500
+
+@async_jwt_required_with_user
+async def get_todo_changes(session, current_user):
+    """Get todos created, updated or deleted after a sync cursor"""
+    try:
+        limit = min(request.args.get('limit', 100, type=int), 1000)
+        since = request.args.get('since')
+        
+        change_seq, todo_id, cursor_horizon = 0, 0, None
+        if since:
+            try:
+                change_seq, todo_id, cursor_horizon = decode_sync_cursor(since)
+            except InvalidCursor:
+                return jsonify({'error': 'Invalid cursor'}), 400
+        
+        horizon = await session.scalar(sync_horizon_statement(current_user.id))
+        if cursor_horizon is None:
+            # A full sync needs none of the tombstones purged before it started
+            cursor_horizon = horizon
+        if sync_cursor_expired(change_seq, cursor_horizon, horizon):
+            return jsonify({'error': 'Sync cursor expired; full resync required', 'resync_required': True}), 410
+        
+        todos_statement, tombstones_statement = todo_changes_statements(
+            current_user.id, change_seq, todo_id, limit
+        )
+        todos = (await session.scalars(todos_statement)).all()
+        tombstones = (await session.scalars(tombstones_statement)).all()
+        
+        return jsonify(todo_changes(todos, tombstones, (change_seq, todo_id), cursor_horizon, limit)), 200
+        
+    except Exception:
+        logger.exception("Error getting todo changes")
+        return jsonify({'error': 'Failed to get changes'}), 500
+
+@async_jwt_required_with_user
+async def get_todo(session, current_user, todo_id):
+    """Get a specific todo"""
+    try:
+        # Conditional GET: compare against updated_at before loading the row
+        if is_conditional():
+            updated_at = await session.scalar(
+                select(Todo.updated_at).where(Todo.id == todo_id, Todo.user_id == current_user.id)
+            )
+            if updated_at is None:
+                return jsonify({'error': 'Todo not found'}), 404
+            etag = make_etag('todo', todo_id, updated_at.isoformat())
+            if is_not_modified(etag, updated_at):
+                return not_modified(etag, updated_at)
+        
+        todo = await _find_todo(session, current_user.id, todo_id)
+        
+        if not todo:
+            return jsonify({'error': 'Todo not found'}), 404
+        
+        etag = make_etag('todo', todo_id, todo.updated_at.isoformat())
+        return with_validators((jsonify({'todo': todo.to_dict()}), 200), etag, todo.updated_at)
+        
+    except Exception:
+        logger.exception("Error getting todo")
+        return jsonify({'error': 'Failed to get todo'}), 500
+
+@async_jwt_required_with_user
+async def update_todo(session, current_user, todo_id):
+    """Update a todo"""
+    try:
+        todo = await _find_todo(session, current_user.id, todo_id)
+        
+        if not todo:
+            return jsonify({'error': 'Todo not found'}), 404
+        
+        data = request.get_json()
+        
+        changes, error = validate_todo_changes(data)
+        if error:
+            return jsonify({'error': error}), 400
+        
+        # Update fields if provided
+        completed = changes.pop('completed', None)
+        for field, value in changes.items():
+            setattr(todo, field, value)
+        
+        if completed is not None:
+            if completed and not todo.completed:
+                todo.mark_completed()
+            elif not completed and todo.completed:
+                todo.mark_incomplete()
+        
+        async with async_db.writer():
+            todo.change_seq = await _bump_todos_version(session, current_user.id)
+            await session.commit()
+        await session.refresh(todo)
+        invalidate_todo_stats(current_user.id)
+        
+        return jsonify({
+            'message': 'Todo updated successfully',
+            'todo': todo.to_dict()
+        }), 200
+        
+    except Exception:
+        await session.rollback()
+        logger.exception("Error updating todo")
+        return jsonify({'error': 'Failed to update todo'}), 500
+
+@async_jwt_required_with_user
+async def delete_todo(session, current_user, todo_id):
+    """Delete a todo"""
+    try:
+        todo = await _find_todo(session, current_user.id, todo_id)
+        
+        if not todo:
+            return jsonify({'error': 'Todo not found'}), 404
+        
+        # Leave a tombstone so delta sync clients see the deletion
+        async with async_db.writer():
+            session.add(TodoTombstone(
+                todo_id=todo.id,
+                user_id=current_user.id,
+                change_seq=await _bump_todos_version(session, current_user.id)
+            ))
+            await session.delete(todo)
+            await session.commit()
+        invalidate_todo_stats(current_user.id)
+        
+        return jsonify({'message': 'Todo deleted successfully'}), 200
+        
+    except Exception:
+        await session.rollback()
+        logger.exception("Error deleting todo")
+        return jsonify({'error': 'Failed to delete todo'}), 500
+
+@async_jwt_required_with_user
+async def get_todo_stats(session, current_user):
+    """Get todo statistics for current user"""
+    try:
+        stats = await session.run_sync(lambda sync_session: load_todo_stats(current_user.id, sync_session))
+        
+        # Stats also change as todos become overdue, so tag the figures themselves
+        etag = make_etag('stats', current_user.id, sorted(stats.items()))
+        if is_not_modified(etag):
+            return not_modified(etag)
+        
+        return with_validators((jsonify({'stats': stats}), 200), etag)
+        
+    except Exception:
+        logger.exception("Error getting todo stats")
+        return jsonify({'error': 'Failed to get statistics'}), 500
+
+todo_routes = [
+    Route('/api/todos', async_db.view(get_todos), methods=['GET']),
+    Route('/api/todos', async_db.view(create_todo), methods=['POST']),
+    Route('/api/todos/changes', async_db.view(get_todo_changes), methods=['GET']),
+    Route('/api/todos/stats', async_db.view(get_todo_stats), methods=['GET']),
+    Route('/api/todos/{todo_id:int}', async_db.view(get_todo), methods=['GET']),
+    Route('/api/todos/{todo_id:int}', async_db.view(update_todo), methods=['PUT']),
+    Route('/api/todos/{todo_id:int}', async_db.view(delete_todo), methods=['DELETE']),
+]
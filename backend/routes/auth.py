@@ -1,12 +1,25 @@
+import logging
 from flask import Blueprint, request, jsonify
 from models.models import User, db
-from utils.auth import generate_tokens, validate_email, validate_password, jwt_required_with_user
+from utils.auth import (
+    generate_tokens, user_claims, get_current_user, validate_email, validate_password, jwt_required_with_user
+)
 from utils.google_auth import verify_google_token, get_google_user_info
 from utils.email_service import send_welcome_email
+from utils.notifications import NOTIFICATION_MODES, notifier
+from utils.passwords import PasswordHasherBusy
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
+logger = logging.getLogger(__name__)
+
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 
+def _server_busy():
+    """503 returned when the password hashing pool is saturated"""
+    response = jsonify({'error': 'Server busy, please retry shortly'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
 @auth_bp.route('/register', methods=['POST'])
 def register():
     """Register a new user"""
@@ -50,7 +63,7 @@ def register():
         db.session.commit()
         
         # Generate tokens
-        tokens = generate_tokens(user.id)
+        tokens = generate_tokens(user.id, user_claims(user))
         
         # Send welcome email
         send_welcome_email(user.email, user.first_name)
@@ -61,9 +74,12 @@ def register():
             **tokens
         }), 201
         
-    except Exception as e:
+    except PasswordHasherBusy:
         db.session.rollback()
-        print(f"Registration error: {e}")
+        return _server_busy()
+    except Exception:
+        db.session.rollback()
+        logger.exception("Registration error")
         return jsonify({'error': 'Registration failed'}), 500
 
 @auth_bp.route('/login', methods=['POST'])
@@ -87,8 +103,13 @@ def login():
         if not user.is_active:
             return jsonify({'error': 'Account is deactivated'}), 401
         
+        # Transparently move the stored hash to the configured bcrypt cost
+        if user.password_needs_rehash():
+            user.set_password(password)
+            db.session.commit()
+        
         # Generate tokens
-        tokens = generate_tokens(user.id)
+        tokens = generate_tokens(user.id, user_claims(user))
         
         return jsonify({
             'message': 'Login successful',
@@ -96,8 +117,12 @@ def login():
             **tokens
         }), 200
         
-    except Exception as e:
-        print(f"Login error: {e}")
+    except PasswordHasherBusy:
+        db.session.rollback()
+        return _server_busy()
+    except Exception:
+        db.session.rollback()
+        logger.exception("Login error")
         return jsonify({'error': 'Login failed'}), 500
 
 @auth_bp.route('/google', methods=['POST'])
@@ -149,7 +174,7 @@ def google_login():
             return jsonify({'error': 'Account is deactivated'}), 401
         
         # Generate tokens
-        tokens = generate_tokens(user.id)
+        tokens = generate_tokens(user.id, user_claims(user))
         
         return jsonify({
             'message': 'Google login successful',
@@ -157,9 +182,9 @@ def google_login():
             **tokens
         }), 200
         
-    except Exception as e:
+    except Exception:
         db.session.rollback()
-        print(f"Google login error: {e}")
+        logger.exception("Google login error")
         return jsonify({'error': 'Google login failed'}), 500
 
 @auth_bp.route('/refresh', methods=['POST'])
@@ -174,7 +199,7 @@ def refresh():
             return jsonify({'error': 'User not found or inactive'}), 404
         
         # Generate new access token
-        tokens = generate_tokens(user.id)
+        tokens = generate_tokens(user.id, user_claims(user))
         
         return jsonify({
             'message': 'Token refreshed successfully',
@@ -182,18 +207,58 @@ def refresh():
             **tokens
         }), 200
         
-    except Exception as e:
-        print(f"Token refresh error: {e}")
+    except Exception:
+        logger.exception("Token refresh error")
         return jsonify({'error': 'Token refresh failed'}), 500
 
 @auth_bp.route('/me', methods=['GET'])
-@jwt_required_with_user
-def get_current_user_info(current_user):
+@jwt_required()
+def get_current_user_info():
     """Get current user information"""
+    current_user = get_current_user()
+    if not current_user:
+        return jsonify({'error': 'User not found'}), 404
+    
     return jsonify({
         'user': current_user.to_dict()
     }), 200
 
+@auth_bp.route('/preferences', methods=['GET'])
+@jwt_required_with_user
+def get_preferences(current_user):
+    """Get the current user's notification preferences"""
+    return jsonify({
+        'preferences': {'notification_mode': notifier.mode_for(current_user)}
+    }), 200
+
+@auth_bp.route('/preferences', methods=['PUT'])
+@jwt_required()
+def update_preferences():
+    """Update the current user's notification preferences (null restores the default)"""
+    try:
+        data = request.get_json()
+        
+        mode = data.get('notification_mode')
+        if mode is not None and mode not in NOTIFICATION_MODES:
+            return jsonify({'error': f"notification_mode must be one of {', '.join(NOTIFICATION_MODES)}"}), 400
+        
+        current_user = get_current_user()
+        if not current_user:
+            return jsonify({'error': 'User not found'}), 404
+        
+        current_user.notification_mode = mode
+        db.session.commit()
+        
+        return jsonify({
+            'message': 'Preferences updated successfully',
+            'preferences': {'notification_mode': notifier.mode_for(current_user)}
+        }), 200
+        
+    except Exception:
+        db.session.rollback()
+        logger.exception("Preferences update error")
+        return jsonify({'error': 'Failed to update preferences'}), 500
+
 @auth_bp.route('/logout', methods=['POST'])
 @jwt_required()
 def logout():
@@ -1,8 +1,26 @@
-from flask import Blueprint, request, jsonify
-from models.models import Todo, db
+import logging
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
+from models.models import Todo, TodoTombstone, db
 from utils.auth import jwt_required_with_user
-from utils.email_service import send_todo_notification
+from utils.notifications import notifier
+from utils.stats import load_todo_stats, invalidate_todo_stats
+from utils.validation import validate_new_todo, validate_todo_changes, is_todo_id
+from utils.versioning import bump_todos_version, get_todos_version
+from utils.http_cache import make_etag, request_args_key, is_conditional, is_not_modified, with_validators, not_modified
+from utils.serializers import TODO_COLUMNS, TODO_FIELDS, todo_row_to_dict, todo_row_to_csv
+from utils.importer import IMPORT_FORMATS, format_from_mimetype, iter_records, iter_import, import_todos
+from utils.pagination import decode_sync_cursor, InvalidCursor, paginate_rows
+from utils.todo_queries import (
+    todo_list_statements, cursor_page_statement, cursor_page, todo_changes_statements, todo_changes,
+    sync_horizon_statement, sync_cursor_expired
+)
+from sqlalchemy import select, insert, update, delete
 from datetime import datetime
+import csv
+import io
+import zlib
+
+logger = logging.getLogger(__name__)
 
 todos_bp = Blueprint('todos', __name__, url_prefix='/api/todos')
 
@@ -17,52 +35,53 @@ def get_todos(current_user):
         completed = request.args.get('completed')
         priority = request.args.get('priority')
         search = request.args.get('search', '').strip()
+        cursor = request.args.get('cursor')
+        
+        # Conditional GET: answer from the collection version alone
+        version, changed_at = get_todos_version(current_user.id)
+        etag = make_etag('todos', current_user.id, version, request_args_key())
+        if is_not_modified(etag, changed_at):
+            return not_modified(etag, changed_at)
+        
+        # Build query over plain columns: no ORM objects are loaded.
+        # Rank by relevance in page mode; cursor mode keeps (created_at, id) order
+        query, count_query = todo_list_statements(
+            current_user.id, completed, priority, search, ranked=cursor is None
+        )
         
-        # Build query
-        query = Todo.query.filter_by(user_id=current_user.id)
-        
-        # Apply filters
-        if completed is not None:
-            completed_bool = completed.lower() in ['true', '1', 'yes']
-            query = query.filter_by(completed=completed_bool)
-        
-        if priority and priority in ['low', 'medium', 'high']:
-            query = query.filter_by(priority=priority)
-        
-        if search:
-            query = query.filter(
-                Todo.title.ilike(f'%{search}%') | 
-                Todo.description.ilike(f'%{search}%')
-            )
+        # Cursor mode: keyset pagination on (created_at, id), no COUNT
+        if cursor is not None:
+            return with_validators(_get_todos_page_by_cursor(query, cursor, per_page), etag, changed_at)
         
         # Order by created_at desc
-        query = query.order_by(Todo.created_at.desc())
+        query = query.order_by(Todo.created_at.desc(), Todo.id.desc())
         
         # Paginate
-        todos_pagination = query.paginate(
-            page=page, 
-            per_page=per_page, 
-            error_out=False
-        )
-        
-        todos = [todo.to_dict() for todo in todos_pagination.items]
+        rows, pagination = paginate_rows(db.session, query, count_query, page, per_page)
         
-        return jsonify({
-            'todos': todos,
+        return with_validators((jsonify({
+            'todos': [todo_row_to_dict(row) for row in rows],
             'pagination': {
                 'page': page,
                 'per_page': per_page,
-                'total': todos_pagination.total,
-                'pages': todos_pagination.pages,
-                'has_next': todos_pagination.has_next,
-                'has_prev': todos_pagination.has_prev
+                **pagination
             }
-        }), 200
+        }), 200), etag, changed_at)
         
-    except Exception as e:
-        print(f"Error getting todos: {e}")
+    except Exception:
+        logger.exception("Error getting todos")
         return jsonify({'error': 'Failed to get todos'}), 500
 
+def _get_todos_page_by_cursor(query, cursor, per_page):
+    """Return one page of todos after the given cursor (empty cursor = first page)"""
+    try:
+        statement = cursor_page_statement(query, cursor, per_page)
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    
+    rows = db.session.execute(statement).all()
+    return jsonify(cursor_page(rows, per_page)), 200
+
 @todos_bp.route('', methods=['POST'])
 @jwt_required_with_user
 def create_todo(current_user):
@@ -70,70 +89,359 @@ def create_todo(current_user):
     try:
         data = request.get_json()
         
-        title = data.get('title', '').strip()
-        if not title:
-            return jsonify({'error': 'Title is required'}), 400
-        
-        description = data.get('description', '').strip() or None
-        priority = data.get('priority', 'medium')
-        due_date_str = data.get('due_date')
-        
-        # Validate priority
-        if priority not in ['low', 'medium', 'high']:
-            priority = 'medium'
-        
-        # Parse due date
-        due_date = None
-        if due_date_str:
-            try:
-                due_date = datetime.fromisoformat(due_date_str.replace('Z', '+00:00'))
-            except ValueError:
-                return jsonify({'error': 'Invalid due_date format. Use ISO format.'}), 400
+        fields, error = validate_new_todo(data)
+        if error:
+            return jsonify({'error': error}), 400
         
         # Create todo
-        todo = Todo(
-            title=title,
-            user_id=current_user.id,
-            description=description,
-            priority=priority,
-            due_date=due_date
-        )
+        todo = Todo(user_id=current_user.id, **fields)
+        todo.change_seq = bump_todos_version(current_user.id)
         
         db.session.add(todo)
         db.session.commit()
+        invalidate_todo_stats(current_user.id)
         
-        # Send email notification
-        send_todo_notification(
-            current_user.email,
-            current_user.first_name,
-            todo.title,
-            todo.description
-        )
+        # Queue the email notification (sent alone or in a digest, per the user's preference)
+        notifier.todo_created(current_user, todo.title, todo.description)
         
         return jsonify({
             'message': 'Todo created successfully',
             'todo': todo.to_dict()
         }), 201
         
-    except Exception as e:
+    except Exception:
         db.session.rollback()
-        print(f"Error creating todo: {e}")
+        logger.exception("Error creating todo")
         return jsonify({'error': 'Failed to create todo'}), 500
 
+@todos_bp.route('/bulk', methods=['POST'])
+@jwt_required_with_user
+def bulk_todos(current_user):
+    """Apply a batch of create/update/complete/delete operations in one transaction
+
+    Body: {"operations": [{"op": "create", "title": ...},
+                          {"op": "update", "id": 1, "priority": "high"},
+                          {"op": "complete", "id": 2, "completed": true},
+                          {"op": "delete", "id": 3}]}
+    Invalid or unknown items are reported per item and skipped; the rest are
+    applied with one set-based statement per kind of change.
+    """
+    try:
+        data = request.get_json() or {}
+        operations = data.get('operations')
+        
+        if not isinstance(operations, list) or not operations:
+            return jsonify({'error': 'operations must be a non-empty list'}), 400
+        
+        max_operations = current_app.config['BULK_MAX_OPERATIONS']
+        if len(operations) > max_operations:
+            return jsonify({'error': f'At most {max_operations} operations per request'}), 400
+        
+        results = [None] * len(operations)
+        creates = []            # (index, fields)
+        updates = {}            # sorted change items -> [ids]
+        completion = {True: [], False: []}
+        deletes = []
+        
+        # Load ownership for every referenced id with one query
+        referenced = {op.get('id') for op in operations
+                      if isinstance(op, dict) and is_todo_id(op.get('id'))}
+        owned = set()
+        if referenced:
+            owned = set(db.session.scalars(
+                select(Todo.id).where(Todo.user_id == current_user.id, Todo.id.in_(referenced))
+            ))
+        
+        seen_ids = set()
+        for index, op in enumerate(operations):
+            kind = op.get('op') if isinstance(op, dict) else None
+            result = {'index': index, 'op': kind}
+            results[index] = result
+            
+            if kind not in ['create', 'update', 'complete', 'delete']:
+                result.update(status=400, error='Unknown op')
+                continue
+            
+            if kind == 'create':
+                fields, error = validate_new_todo(op)
+                if error:
+                    result.update(status=400, error=error)
+                    continue
+                creates.append((index, fields))
+                continue
+            
+            todo_id = op.get('id')
+            result['id'] = todo_id
+            if not is_todo_id(todo_id):
+                result.update(status=400, error='id must be an integer')
+                continue
+            if todo_id not in owned:
+                result.update(status=404, error='Todo not found')
+                continue
+            if todo_id in seen_ids:
+                result.update(status=400, error='Todo referenced more than once')
+                continue
+            seen_ids.add(todo_id)
+            
+            if kind == 'delete':
+                deletes.append(todo_id)
+            elif kind == 'complete':
+                completed = op.get('completed', True)
+                if not isinstance(completed, bool):
+                    result.update(status=400, error='completed must be true or false')
+                    continue
+                completion[completed].append(todo_id)
+            else:
+                changes, error = validate_todo_changes(op)
+                if error:
+                    result.update(status=400, error=error)
+                    continue
+                completed = changes.pop('completed', None)
+                if completed is not None:
+                    completion[completed].append(todo_id)
+                if changes:
+                    updates.setdefault(tuple(sorted(changes.items())), []).append(todo_id)
+            result['status'] = 200
+        
+        user_todos = (Todo.user_id == current_user.id)
+        now = datetime.utcnow()
+        
+        # One version bump stamps every row this request touches
+        if creates or updates or completion[True] or completion[False] or deletes:
+            version = bump_todos_version(current_user.id)
+        
+        # One executemany INSERT without RETURNING (SQLite would run RETURNING
+        # row by row), then the new ids in one indexed SELECT: the version bump
+        # holds the user's row lock, so only these rows carry this change_seq
+        # and their ids ascend in insert order
+        if creates:
+            rows = [dict(fields, user_id=current_user.id, change_seq=version) for _, fields in creates]
+            db.session.execute(insert(Todo), rows)
+            new_ids = db.session.scalars(
+                select(Todo.id).where(user_todos, Todo.change_seq == version).order_by(Todo.id)
+            ).all()
+            for (index, _), todo_id in zip(creates, new_ids):
+                results[index].update(id=todo_id, status=201)
+        
+        for changes, ids in updates.items():
+            db.session.execute(
+                update(Todo).where(user_todos, Todo.id.in_(ids)).values(dict(changes, change_seq=version)),
+                execution_options={'synchronize_session': False}
+            )
+        
+        # Same semantics as mark_completed / mark_incomplete: only rows whose state flips change
+        if completion[True]:
+            db.session.execute(
+                update(Todo)
+                .where(user_todos, Todo.id.in_(completion[True]), Todo.completed == False)
+                .values(completed=True, completed_at=now, change_seq=version),
+                execution_options={'synchronize_session': False}
+            )
+        if completion[False]:
+            db.session.execute(
+                update(Todo)
+                .where(user_todos, Todo.id.in_(completion[False]), Todo.completed == True)
+                .values(completed=False, completed_at=None, change_seq=version),
+                execution_options={'synchronize_session': False}
+            )
+        
+        if deletes:
+            db.session.execute(insert(TodoTombstone), [
+                {'todo_id': todo_id, 'user_id': current_user.id, 'change_seq': version, 'deleted_at': now}
+                for todo_id in deletes
+            ])
+            db.session.execute(
+                delete(Todo).where(user_todos, Todo.id.in_(deletes)),
+                execution_options={'synchronize_session': False}
+            )
+        
+        db.session.commit()
+        invalidate_todo_stats(current_user.id)
+        
+        # Return the current state of every created/updated todo in one query
+        changed_ids = [r['id'] for r in results
+                       if r.get('status') in (200, 201) and r['op'] != 'delete']
+        if changed_ids:
+            todos = {todo.id: todo.to_dict() for todo in
+                     Todo.query.filter(user_todos, Todo.id.in_(changed_ids))}
+            for result in results:
+                if result.get('id') in todos and result['op'] != 'delete':
+                    result['todo'] = todos[result['id']]
+        
+        return jsonify({
+            'results': results,
+            'applied': sum(1 for r in results if r.get('status') in (200, 201)),
+            'failed': sum(1 for r in results if r.get('status') not in (200, 201))
+        }), 200
+        
+    except Exception:
+        db.session.rollback()
+        logger.exception("Error applying bulk operations")
+        return jsonify({'error': 'Failed to apply bulk operations'}), 500
+
+@todos_bp.route('/changes', methods=['GET'])
+@jwt_required_with_user
+def get_todo_changes(current_user):
+    """Get todos created, updated or deleted after a sync cursor
+
+    Omit `since` for a full initial sync, then pass back `next_cursor`.
+    Changes come in (change_seq, id) order; keep calling while has_more.
+    A 410 with resync_required means deletions after the cursor are past
+    TOMBSTONE_RETENTION_DAYS: drop the local copy and sync from scratch.
+    """
+    try:
+        limit = min(request.args.get('limit', 100, type=int), 1000)
+        since = request.args.get('since')
+        
+        change_seq, todo_id, cursor_horizon = 0, 0, None
+        if since:
+            try:
+                change_seq, todo_id, cursor_horizon = decode_sync_cursor(since)
+            except InvalidCursor:
+                return jsonify({'error': 'Invalid cursor'}), 400
+        
+        horizon = db.session.scalar(sync_horizon_statement(current_user.id))
+        if cursor_horizon is None:
+            # A full sync needs none of the tombstones purged before it started
+            cursor_horizon = horizon
+        if sync_cursor_expired(change_seq, cursor_horizon, horizon):
+            return jsonify({'error': 'Sync cursor expired; full resync required', 'resync_required': True}), 410
+        
+        todos_statement, tombstones_statement = todo_changes_statements(
+            current_user.id, change_seq, todo_id, limit
+        )
+        todos = db.session.scalars(todos_statement).all()
+        tombstones = db.session.scalars(tombstones_statement).all()
+        
+        return jsonify(todo_changes(todos, tombstones, (change_seq, todo_id), cursor_horizon, limit)), 200
+        
+    except Exception:
+        logger.exception("Error getting todo changes")
+        return jsonify({'error': 'Failed to get changes'}), 500
+
+@todos_bp.route('/export', methods=['GET'])
+@jwt_required_with_user
+def export_todos(current_user):
+    """Stream all of the user's todos as NDJSON or CSV (?format=ndjson|csv&gzip=1)"""
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in ['ndjson', 'csv']:
+        return jsonify({'error': 'format must be ndjson or csv'}), 400
+    use_gzip = request.args.get('gzip', '').lower() in ['true', '1', 'yes']
+    
+    # Server-side cursor, fetched in batches of plain column tuples
+    statement = (
+        select(*TODO_COLUMNS)
+        .where(Todo.user_id == current_user.id)
+        .order_by(Todo.id)
+        .execution_options(yield_per=current_app.config['EXPORT_BATCH_SIZE'])
+    )
+    
+    def generate_ndjson(partitions):
+        dumps = current_app.json.dumps
+        for rows in partitions:
+            yield ''.join(dumps(todo_row_to_dict(row)) + '\n' for row in rows)
+    
+    def generate_csv(partitions):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(TODO_FIELDS)
+        for rows in partitions:
+            writer.writerows(todo_row_to_csv(row) for row in rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+    
+    def generate():
+        try:
+            partitions = db.session.execute(statement).partitions()
+            chunks = generate_ndjson(partitions) if export_format == 'ndjson' else generate_csv(partitions)
+            if not use_gzip:
+                yield from chunks
+                return
+            compressor = zlib.compressobj(current_app.config['EXPORT_GZIP_LEVEL'], zlib.DEFLATED, 31)
+            for chunk in chunks:
+                data = compressor.compress(chunk.encode('utf-8'))
+                if data:
+                    yield data
+            yield compressor.flush()
+        except Exception:
+            # Headers are already sent; the truncated body is all we can signal
+            logger.exception("Error exporting todos")
+            raise
+    
+    filename = f'todos.{export_format}'
+    mimetype = 'application/x-ndjson' if export_format == 'ndjson' else 'text/csv'
+    if use_gzip:
+        filename += '.gz'
+        mimetype = 'application/gzip'
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+@todos_bp.route('/import', methods=['POST'])
+@jwt_required_with_user
+def import_todos_upload(current_user):
+    """Import todos from a JSON array, NDJSON or CSV request body
+
+    The body is parsed incrementally and inserted in batches, without
+    notification emails. Pass ?progress=1 to get one NDJSON progress line
+    per batch followed by the summary, instead of a single JSON summary.
+    """
+    import_format = request.args.get('format') or format_from_mimetype(request.mimetype)
+    if import_format not in IMPORT_FORMATS:
+        return jsonify({'error': f"format must be one of {', '.join(IMPORT_FORMATS)}"}), 400
+    
+    records = iter_records(request.stream, import_format)
+    
+    if request.args.get('progress', '').lower() in ['true', '1', 'yes']:
+        def generate():
+            try:
+                for report in iter_import(current_user.id, records):
+                    key = 'import' if report.get('done') else 'progress'
+                    yield current_app.json.dumps({key: report}) + '\n'
+            except Exception:
+                logger.exception("Error importing todos")
+                yield current_app.json.dumps({'error': 'Import failed'}) + '\n'
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    
+    try:
+        report = import_todos(current_user.id, records)
+        return jsonify({'import': report}), 400 if 'aborted' in report else 200
+    except Exception:
+        logger.exception("Error importing todos")
+        return jsonify({'error': 'Import failed'}), 500
+
 @todos_bp.route('/<int:todo_id>', methods=['GET'])
 @jwt_required_with_user
 def get_todo(current_user, todo_id):
     """Get a specific todo"""
     try:
+        # Conditional GET: compare against updated_at before loading the row
+        if is_conditional():
+            updated_at = db.session.scalar(
+                select(Todo.updated_at).where(Todo.id == todo_id, Todo.user_id == current_user.id)
+            )
+            if updated_at is None:
+                return jsonify({'error': 'Todo not found'}), 404
+            etag = make_etag('todo', todo_id, updated_at.isoformat())
+            if is_not_modified(etag, updated_at):
+                return not_modified(etag, updated_at)
+        
         todo = Todo.query.filter_by(id=todo_id, user_id=current_user.id).first()
         
         if not todo:
             return jsonify({'error': 'Todo not found'}), 404
         
-        return jsonify({'todo': todo.to_dict()}), 200
+        etag = make_etag('todo', todo_id, todo.updated_at.isoformat())
+        return with_validators((jsonify({'todo': todo.to_dict()}), 200), etag, todo.updated_at)
         
-    except Exception as e:
-        print(f"Error getting todo: {e}")
+    except Exception:
+        logger.exception("Error getting todo")
         return jsonify({'error': 'Failed to get todo'}), 500
 
 @todos_bp.route('/<int:todo_id>', methods=['PUT'])
@@ -148,48 +456,33 @@ def update_todo(current_user, todo_id):
         
         data = request.get_json()
         
+        changes, error = validate_todo_changes(data)
+        if error:
+            return jsonify({'error': error}), 400
+        
         # Update fields if provided
-        if 'title' in data:
-            title = data['title'].strip()
-            if not title:
-                return jsonify({'error': 'Title cannot be empty'}), 400
-            todo.title = title
-        
-        if 'description' in data:
-            todo.description = data['description'].strip() or None
-        
-        if 'priority' in data:
-            priority = data['priority']
-            if priority in ['low', 'medium', 'high']:
-                todo.priority = priority
-        
-        if 'due_date' in data:
-            due_date_str = data['due_date']
-            if due_date_str:
-                try:
-                    todo.due_date = datetime.fromisoformat(due_date_str.replace('Z', '+00:00'))
-                except ValueError:
-                    return jsonify({'error': 'Invalid due_date format'}), 400
-            else:
-                todo.due_date = None
+        completed = changes.pop('completed', None)
+        for field, value in changes.items():
+            setattr(todo, field, value)
         
-        if 'completed' in data:
-            completed = data['completed']
+        if completed is not None:
             if completed and not todo.completed:
                 todo.mark_completed()
             elif not completed and todo.completed:
                 todo.mark_incomplete()
         
+        todo.change_seq = bump_todos_version(current_user.id)
         db.session.commit()
+        invalidate_todo_stats(current_user.id)
         
         return jsonify({
             'message': 'Todo updated successfully',
             'todo': todo.to_dict()
         }), 200
         
-    except Exception as e:
+    except Exception:
         db.session.rollback()
-        print(f"Error updating todo: {e}")
+        logger.exception("Error updating todo")
         return jsonify({'error': 'Failed to update todo'}), 500
 
 @todos_bp.route('/<int:todo_id>', methods=['DELETE'])
@@ -202,14 +495,21 @@ def delete_todo(current_user, todo_id):
         if not todo:
             return jsonify({'error': 'Todo not found'}), 404
         
+        # Leave a tombstone so delta sync clients see the deletion
+        db.session.add(TodoTombstone(
+            todo_id=todo.id,
+            user_id=current_user.id,
+            change_seq=bump_todos_version(current_user.id)
+        ))
         db.session.delete(todo)
         db.session.commit()
+        invalidate_todo_stats(current_user.id)
         
         return jsonify({'message': 'Todo deleted successfully'}), 200
         
-    except Exception as e:
+    except Exception:
         db.session.rollback()
-        print(f"Error deleting todo: {e}")
+        logger.exception("Error deleting todo")
         return jsonify({'error': 'Failed to delete todo'}), 500
 
 @todos_bp.route('/stats', methods=['GET'])
@@ -217,38 +517,15 @@ def delete_todo(current_user, todo_id):
 def get_todo_stats(current_user):
     """Get todo statistics for current user"""
     try:
-        total_todos = Todo.query.filter_by(user_id=current_user.id).count()
-        completed_todos = Todo.query.filter_by(user_id=current_user.id, completed=True).count()
-        pending_todos = total_todos - completed_todos
-        
-        # Get todos by priority
-        high_priority = Todo.query.filter_by(user_id=current_user.id, priority='high', completed=False).count()
-        medium_priority = Todo.query.filter_by(user_id=current_user.id, priority='medium', completed=False).count()
-        low_priority = Todo.query.filter_by(user_id=current_user.id, priority='low', completed=False).count()
+        stats = load_todo_stats(current_user.id)
         
-        # Get overdue todos
-        now = datetime.utcnow()
-        overdue_todos = Todo.query.filter(
-            Todo.user_id == current_user.id,
-            Todo.completed == False,
-            Todo.due_date < now
-        ).count()
+        # Stats also change as todos become overdue, so tag the figures themselves
+        etag = make_etag('stats', current_user.id, sorted(stats.items()))
+        if is_not_modified(etag):
+            return not_modified(etag)
         
-        return jsonify({
-            'stats': {
-                'total_todos': total_todos,
-                'completed_todos': completed_todos,
-                'pending_todos': pending_todos,
-                'completion_rate': round((completed_todos / total_todos * 100) if total_todos > 0 else 0, 2),
-                'priority_breakdown': {
-                    'high': high_priority,
-                    'medium': medium_priority,
-                    'low': low_priority
-                },
-                'overdue_todos': overdue_todos
-            }
-        }), 200
+        return with_validators((jsonify({'stats': stats}), 200), etag)
         
-    except Exception as e:
-        print(f"Error getting todo stats: {e}")
+    except Exception:
+        logger.exception("Error getting todo stats")
         return jsonify({'error': 'Failed to get statistics'}), 500
@@ -2,20 +2,29 @@
 """
 Database setup and initialization script
 """
+import gzip
 import os
 import sys
 from app import create_app
+from sqlalchemy import text
 from models.models import db, User, Todo
+from utils.schema import init_schema
+from utils.importer import IMPORT_FORMATS, iter_records, iter_import
 
 def setup_database():
-    """Create database tables and add sample data"""
+    """Create or upgrade the database schema and optionally add sample data
+
+    Safe to run on every deploy, before the web workers start.
+    """
     app = create_app()
     
+    print("Creating database tables...")
+    added = init_schema(app)
+    for column in added:
+        print(f"  added column {column}")
+    print("✅ Database tables created successfully!")
+    
     with app.app_context():
-        print("Creating database tables...")
-        db.create_all()
-        print("✅ Database tables created successfully!")
-        
         # Check if we should add sample data
         if len(sys.argv) > 1 and sys.argv[1] == '--sample-data':
             print("\nAdding sample data...")
@@ -77,12 +86,60 @@ def reset_database():
     with app.app_context():
         print("Dropping all database tables...")
         db.drop_all()
-        print("Creating database tables...")
-        db.create_all()
-        print("✅ Database reset complete!")
+        if db.engine.dialect.name == 'sqlite':
+            with db.engine.begin() as conn:
+                conn.execute(text('DROP TABLE IF EXISTS todos_fts'))
+    print("Creating database tables...")
+    init_schema(app)
+    print("✅ Database reset complete!")
+
+def import_todos_file(path, email, import_format=None):
+    """Bulk import todos for a user from a JSON, NDJSON or CSV file"""
+    if not import_format:
+        extension = os.path.splitext(path[:-3] if path.endswith('.gz') else path)[1].lstrip('.')
+        import_format = {'jsonl': 'ndjson'}.get(extension, extension)
+    if import_format not in IMPORT_FORMATS:
+        print(f"❌ Unknown format '{import_format}', use --format {'|'.join(IMPORT_FORMATS)}")
+        return
+    
+    app = create_app()
+    
+    with app.app_context():
+        user = User.query.filter_by(email=email.lower().strip()).first()
+        if not user:
+            print(f"❌ No user with email {email}")
+            return
+        
+        print(f"Importing {path} ({import_format}) for {user.email}...")
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rb') as f:
+            for report in iter_import(user.id, iter_records(f, import_format)):
+                if report.get('done'):
+                    break
+                rate = report['imported'] / report['elapsed_seconds'] if report['elapsed_seconds'] else 0
+                print(f"  {report['imported']} imported, {report['rejected']} rejected ({rate:.0f} rows/s)")
+        
+        for error in report['errors']:
+            print(f"  record {error['record']}: {error['error']}")
+        if 'aborted' in report:
+            print(f"❌ {report['aborted']}")
+        print(f"✅ Imported {report['imported']} todos in {report['elapsed_seconds']}s")
+
+def _option(name):
+    """Value following a command line flag, or None"""
+    if name in sys.argv:
+        index = sys.argv.index(name)
+        if index + 1 < len(sys.argv):
+            return sys.argv[index + 1]
+    return None
 
 if __name__ == '__main__':
     if len(sys.argv) > 1 and sys.argv[1] == '--reset':
         reset_database()
+    elif len(sys.argv) > 1 and sys.argv[1] == '--import':
+        if not _option('--import') or not _option('--user'):
+            print("Usage: python setup_db.py --import FILE --user EMAIL [--format json|ndjson|csv]")
+            sys.exit(1)
+        import_todos_file(_option('--import'), _option('--user'), _option('--format'))
     else:
         setup_database()
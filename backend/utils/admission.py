@@ -0,0 +1,291 @@
+import logging
+import math
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from flask import g, jsonify, request
+from flask_jwt_extended import decode_token
+
+logger = logging.getLogger(__name__)
+
+# Never throttled: probes, scrapes and CORS preflights
+EXEMPT_ENDPOINTS = {'health_check', 'metrics_endpoint', 'static'}
+
+class MemoryStore:
+    """Admission state for a single process
+
+    Token buckets and marks are kept LRU-bounded; evicting a bucket only
+    forgets tokens a client has already earned back.
+    """
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+        self._in_flight = {}
+        self._marks = OrderedDict()
+
+    def take_token(self, key, rate, burst):
+        """Take one token from key's bucket; returns 0, or seconds until one is available"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+            if not wait:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def acquire(self, key, limit):
+        """Claim one of key's limit concurrent slots; returns a slot handle or None"""
+        with self._lock:
+            count = self._in_flight.get(key, 0)
+            if count >= limit:
+                return None
+            self._in_flight[key] = count + 1
+        return True
+
+    def release(self, key, slot):
+        with self._lock:
+            count = self._in_flight.get(key, 0) - 1
+            if count > 0:
+                self._in_flight[key] = count
+            else:
+                self._in_flight.pop(key, None)
+
+    def mark(self, key, ttl):
+        """Set a flag on key that expires after ttl seconds"""
+        with self._lock:
+            self._marks.pop(key, None)
+            self._marks[key] = time.monotonic() + ttl
+            while len(self._marks) > self.max_keys:
+                self._marks.popitem(last=False)
+
+    def marked(self, key):
+        """True until key's mark expires"""
+        with self._lock:
+            expires = self._marks.get(key)
+        return expires is not None and expires > time.monotonic()
+
+class SQLiteStore:
+    """Admission state in a SQLite file shared by every worker on the host
+
+    Each in-flight request holds a row, so slots left behind by a killed
+    worker simply expire after slot_ttl seconds.
+    """
+
+    SCHEMA = [
+        'CREATE TABLE IF NOT EXISTS admission_buckets (key TEXT PRIMARY KEY, tokens REAL, updated REAL)',
+        'CREATE TABLE IF NOT EXISTS admission_slots '
+        '(id INTEGER PRIMARY KEY, key TEXT NOT NULL, pid INTEGER, acquired_at REAL NOT NULL)',
+        'CREATE INDEX IF NOT EXISTS ix_admission_slots_key ON admission_slots (key, acquired_at)',
+        'CREATE TABLE IF NOT EXISTS admission_marks (key TEXT PRIMARY KEY, expires REAL NOT NULL)',
+    ]
+
+    def __init__(self, path, slot_ttl=60):
+        self.path = path
+        self.slot_ttl = slot_ttl
+        self._local = threading.local()
+        with self._transaction() as conn:
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+
+    def _connection(self):
+        # One connection per thread, reopened in forked workers
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            # Throttling state is disposable; skip fsyncs
+            conn.execute('PRAGMA synchronous=OFF')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def take_token(self, key, rate, burst):
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute('SELECT tokens, updated FROM admission_buckets WHERE key = ?', (key,)).fetchone()
+            tokens, updated = row or (burst, now)
+            tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+            if not wait:
+                tokens -= 1
+            conn.execute('INSERT OR REPLACE INTO admission_buckets (key, tokens, updated) VALUES (?, ?, ?)',
+                         (key, tokens, now))
+            if random.random() < 0.001:
+                # Buckets idle this long have refilled; dropping them changes nothing
+                conn.execute('DELETE FROM admission_buckets WHERE updated < ?', (now - 3600,))
+        return wait
+
+    def acquire(self, key, limit):
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM admission_slots WHERE key = ? AND acquired_at < ?', (key, now - self.slot_ttl))
+            (count,) = conn.execute('SELECT COUNT(*) FROM admission_slots WHERE key = ?', (key,)).fetchone()
+            if count >= limit:
+                return None
+            return conn.execute('INSERT INTO admission_slots (key, pid, acquired_at) VALUES (?, ?, ?)',
+                                (key, os.getpid(), now)).lastrowid
+
+    def release(self, key, slot):
+        self._connection().execute('DELETE FROM admission_slots WHERE id = ?', (slot,))
+
+    def mark(self, key, ttl):
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute('INSERT OR REPLACE INTO admission_marks (key, expires) VALUES (?, ?)', (key, now + ttl))
+            if random.random() < 0.01:
+                conn.execute('DELETE FROM admission_marks WHERE expires < ?', (now,))
+
+    def marked(self, key):
+        row = self._connection().execute('SELECT expires FROM admission_marks WHERE key = ?', (key,)).fetchone()
+        return row is not None and row[0] > time.time()
+
+def create_store(spec, slot_ttl=60):
+    """Build a store from ADMISSION_STORE (or REPLICA_PIN_STORE): 'memory' or 'sqlite:///path/to/file.db'"""
+    if spec.startswith('sqlite:///'):
+        return SQLiteStore(spec[len('sqlite:///'):], slot_ttl=slot_ttl)
+    if spec != 'memory':
+        raise ValueError(f'Unknown store: {spec}')
+    return MemoryStore()
+
+class AdmissionControl:
+    """Sheds load before a request reaches its view
+
+    Every request first takes a token from its client's bucket (429 when
+    empty), then one of its client's concurrent slots (429 when all are
+    busy), then a global slot. When no global slot is free it waits at
+    most ADMISSION_QUEUE_TIMEOUT, with at most ADMISSION_MAX_QUEUE requests
+    waiting per worker, before answering 503. Clients are keyed by JWT
+    identity when the request carries a valid token, else by IP.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._store = None
+        self._lock = threading.Lock()
+        self._waiting = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['admission'] = self
+        if app.config['ADMISSION_ENABLED']:
+            app.before_request(self._admit)
+            app.teardown_request(self._release)
+
+    @property
+    def store(self):
+        # Created per process so forked workers never share in-memory counters or SQLite handles
+        store = self._store
+        if store is None or store[0] != os.getpid():
+            with self._lock:
+                store = self._store
+                if store is None or store[0] != os.getpid():
+                    store = (os.getpid(), create_store(self.app.config['ADMISSION_STORE'],
+                                                       slot_ttl=self.app.config['ADMISSION_SLOT_TTL']))
+                    self._store = store
+                    self._waiting = 0
+        return store[1]
+
+    def _client(self):
+        """(key, rate, burst) for the client making the current request"""
+        config = self.app.config
+        auth = request.headers.get('Authorization', '')
+        if auth.startswith('Bearer '):
+            try:
+                identity = decode_token(auth[len('Bearer '):], allow_expired=True)['sub']
+                return f'user:{identity}', config['ADMISSION_USER_RATE'], config['ADMISSION_USER_BURST']
+            except Exception:
+                pass
+        if config['ADMISSION_TRUST_PROXY'] and request.access_route:
+            address = request.access_route[0]
+        else:
+            address = request.remote_addr
+        return f'ip:{address}', config['ADMISSION_IP_RATE'], config['ADMISSION_IP_BURST']
+
+    def _reject(self, status, message, retry_after):
+        response = jsonify({'error': message})
+        response.status_code = status
+        response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+        return response
+
+    def _admit(self):
+        if request.method == 'OPTIONS' or request.endpoint in EXEMPT_ENDPOINTS:
+            return None
+        config = self.app.config
+        try:
+            store = self.store
+            key, rate, burst = self._client()
+            g._admission_slots = slots = []
+
+            wait = store.take_token(key, rate, burst)
+            if wait:
+                return self._reject(429, 'Too many requests', wait)
+
+            slot = store.acquire(key, config['ADMISSION_CLIENT_IN_FLIGHT'])
+            if slot is None:
+                return self._reject(429, 'Too many concurrent requests', 1)
+            slots.append((key, slot))
+
+            slot = store.acquire('global', config['ADMISSION_GLOBAL_IN_FLIGHT'])
+            if slot is None:
+                slot = self._wait_for_global_slot(store)
+            if slot is None:
+                return self._reject(503, 'Server busy, please retry', 1)
+            slots.append(('global', slot))
+        except Exception:
+            # Admission is best effort: never fail a request because its store did
+            logger.exception('Admission control failed; admitting request')
+        return None
+
+    def _wait_for_global_slot(self, store):
+        config = self.app.config
+        with self._lock:
+            if self._waiting >= config['ADMISSION_MAX_QUEUE']:
+                return None
+            self._waiting += 1
+        try:
+            deadline = time.monotonic() + config['ADMISSION_QUEUE_TIMEOUT']
+            while time.monotonic() < deadline:
+                time.sleep(0.01)
+                slot = store.acquire('global', config['ADMISSION_GLOBAL_IN_FLIGHT'])
+                if slot is not None:
+                    return slot
+            return None
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+    def _release(self, exc=None):
+        slots = g.pop('_admission_slots', None)
+        if not slots:
+            return
+        store = self.store
+        for key, slot in slots:
+            try:
+                store.release(key, slot)
+            except Exception:
+                logger.exception('Failed to release admission slot %s', key)
+
+admission = AdmissionControl()
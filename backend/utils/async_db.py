@@ -0,0 +1,115 @@
+import asyncio
+from contextlib import asynccontextmanager, nullcontext
+from functools import wraps
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from starlette.responses import Response
+from werkzeug.test import EnvironBuilder
+from models.models import db
+from utils.compression import compress_response
+from utils.database import set_sqlite_pragmas
+
+# Async DBAPI for each sync dialect the app supports
+ASYNC_DRIVERS = {'sqlite': 'sqlite+aiosqlite', 'postgresql': 'postgresql+asyncpg'}
+
+class AsyncDatabase:
+    """Async engine over the Flask app's database, and the glue that serves
+    async Flask-style views from Starlette (see asgi.py)
+
+    Views run inside a Flask request context built from the ASGI request,
+    so flask.request, jsonify, the JWT helpers, caches and config behave
+    as they do in the WSGI routes; only database access differs: views get
+    an AsyncSession as their first argument instead of using db.session,
+    bound to the replica the app's ReplicaRouter picks for the request.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.engine = None
+        self.sessionmaker = None
+        # Replica bind key -> async engine / sessionmaker (config.REPLICA_DATABASE_URLS)
+        self.replica_engines = {}
+        self.replica_sessionmakers = {}
+        self._write_lock = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        with app.app_context():
+            # Flask-SQLAlchemy has already resolved instance-relative SQLite paths
+            urls = {key: engine.url for key, engine in db.engines.items()}
+        replicas = app.extensions.get('replicas')
+        self.engine = self._create_engine(app, urls[None])
+        # Objects stay loaded after commit: lazy refreshes cannot run outside the session's greenlet
+        self.sessionmaker = async_sessionmaker(self.engine, expire_on_commit=False)
+        for key in replicas.keys if replicas is not None else ():
+            self.replica_engines[key] = self._create_engine(app, urls[key])
+            self.replica_sessionmakers[key] = async_sessionmaker(self.replica_engines[key], expire_on_commit=False)
+        if urls[None].get_backend_name() == 'sqlite':
+            self._write_lock = asyncio.Lock()
+        app.extensions['async_db'] = self
+
+    def _create_engine(self, app, url):
+        engine = create_async_engine(
+            url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()]), **app.config['ASYNC_ENGINE_OPTIONS']
+        )
+        set_sqlite_pragmas(engine.sync_engine, app.config.get('SQLITE_PRAGMAS'))
+        return engine
+
+    @asynccontextmanager
+    async def writer(self):
+        """Hold around a write transaction, from its first write to its commit
+
+        SQLite takes one writer at a time, and its busy handler polls with
+        growing sleeps, so dozens of coroutines contending for the lock can
+        starve past busy_timeout; on SQLite writers queue here instead.
+        """
+        async with self._write_lock or nullcontext():
+            yield
+
+    async def dispose(self):
+        for engine in (self.engine, *self.replica_engines.values()):
+            if engine is not None:
+                await engine.dispose()
+
+    def view(self, f):
+        """Starlette endpoint running async view f(session, **path_params)"""
+        @wraps(f)
+        async def endpoint(request):
+            app = self.app
+            environ = EnvironBuilder(
+                path=request.url.path,
+                base_url=f'{request.url.scheme}://{request.url.netloc}',
+                query_string=request.url.query,
+                method=request.method,
+                headers=list(request.headers.items()),
+                data=await request.body(),
+                environ_overrides={'REMOTE_ADDR': request.client.host if request.client else ''},
+            ).get_environ()
+
+            with app.request_context(environ):
+                # Same error handling as Flask's full_dispatch_request / wsgi_app
+                try:
+                    try:
+                        replicas = app.extensions.get('replicas')
+                        replica = replicas.read_replica() if replicas is not None else None
+                        sessionmaker = self.replica_sessionmakers.get(replica, self.sessionmaker)
+                        async with sessionmaker() as session:
+                            rv = await f(session, **request.path_params)
+                    except Exception as e:
+                        rv = app.handle_user_exception(e)
+                    response = app.make_response(rv)
+                except Exception as e:
+                    response = app.make_response(app.handle_exception(e))
+                if app.config['COMPRESS_ENABLED']:
+                    response = compress_response(response)
+
+                # The headers and body Flask would send (nothing for HEAD or 304, for instance)
+                return Response(
+                    b''.join(response.get_app_iter(environ)),
+                    status_code=response.status_code,
+                    headers=dict(response.get_wsgi_headers(environ))
+                )
+        return endpoint
+
+async_db = AsyncDatabase()
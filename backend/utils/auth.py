@@ -1,12 +1,57 @@
-from flask_jwt_extended import create_access_token, create_refresh_token, get_jwt_identity, jwt_required
-from flask import jsonify
+import logging
+from flask_jwt_extended import (
+    create_access_token, create_refresh_token, get_jwt_identity, get_jwt, jwt_required, verify_jwt_in_request
+)
+from flask import jsonify, current_app, has_app_context
 from functools import wraps
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, object_session
 from models.models import User, db
+from utils.cache import TTLCache
 
-def generate_tokens(user_id):
+logger = logging.getLogger(__name__)
+
+# Fields needed to authorize requests and address the user without a DB hit
+USER_FIELDS = (
+    'id', 'email', 'first_name', 'last_name', 'is_active', 'is_google_user', 'profile_picture', 'notification_mode'
+)
+
+class AuthenticatedUser:
+    """Lightweight, session-independent view of the user behind a JWT"""
+    __slots__ = USER_FIELDS
+    
+    def __init__(self, **fields):
+        for name in USER_FIELDS:
+            setattr(self, name, fields.get(name))
+    
+    @classmethod
+    def from_user(cls, user):
+        return cls(**{name: getattr(user, name) for name in USER_FIELDS})
+    
+    def to_claims(self):
+        """Profile fields carried in the access token (identity is the `sub` claim)"""
+        return {name: getattr(self, name) for name in USER_FIELDS if name != 'id'}
+
+def init_app(app):
+    """Attach the authenticated-user cache to the app"""
+    app.extensions['user_cache'] = TTLCache(
+        maxsize=app.config['USER_CACHE_SIZE'],
+        ttl=app.config['USER_CACHE_TTL']
+    )
+
+def user_claims(user):
+    """Claims to embed in access tokens for user, if JWT_USER_CLAIMS is enabled"""
+    if not current_app.config.get('JWT_USER_CLAIMS'):
+        return None
+    return AuthenticatedUser.from_user(user).to_claims()
+
+def generate_tokens(user_id, claims=None):
     """Generate access and refresh tokens for a user"""
     # Convert user_id to string as required by Flask-JWT-Extended
-    access_token = create_access_token(identity=str(user_id))
+    access_token = create_access_token(
+        identity=str(user_id),
+        additional_claims={'usr': claims} if claims else None
+    )
     refresh_token = create_refresh_token(identity=str(user_id))
     
     return {
@@ -19,28 +64,138 @@ def get_current_user():
     """Get current user from JWT token"""
     try:
         current_user_id = get_jwt_identity()
-        print(f"🔍 JWT Debug: Got user ID from token: {current_user_id}")
         if current_user_id:
             # Convert string back to int for database query
-            user = User.query.get(int(current_user_id))
-            print(f"🔍 JWT Debug: Found user: {user.email if user else 'None'}")
-            return user
+            return User.query.get(int(current_user_id))
         return None
-    except Exception as e:
-        print(f"🔍 JWT Debug: Error getting current user: {e}")
+    except Exception:
+        logger.exception("Error getting current user")
         return None
 
+def _known_user(user_id):
+    """(user, updated_at) for the JWT's user from its claims or the user cache
+
+    user is None when the DB must be asked. A cached user comes with the
+    users.updated_at it was read at, which the caller checks against the
+    row: each worker has its own cache and the invalidation hooks below
+    only reach the worker that made the change.
+    """
+    claims = get_jwt().get('usr')
+    if claims is not None:
+        return AuthenticatedUser(id=user_id, **claims), None
+    entry = current_app.extensions['user_cache'].get(user_id)
+    return entry if entry is not None else (None, None)
+
+def _user_stamp_statement(user_id):
+    return select(User.updated_at).where(User.id == user_id)
+
+def _cache_user(db_user):
+    user = AuthenticatedUser.from_user(db_user)
+    current_app.extensions['user_cache'].set(db_user.id, (user, db_user.updated_at))
+    return user
+
+def get_authenticated_user():
+    """Resolve the JWT identity from token claims or the user cache, falling back to the DB"""
+    try:
+        current_user_id = get_jwt_identity()
+        if not current_user_id:
+            return None
+        user_id = int(current_user_id)
+        
+        user, cached_at = _known_user(user_id)
+        if cached_at is not None and db.session.scalar(_user_stamp_statement(user_id)) != cached_at:
+            user = None
+        if user is None:
+            db_user = User.query.get(user_id)
+            if not db_user:
+                return None
+            user = _cache_user(db_user)
+        return user
+    except Exception:
+        logger.exception("Error getting current user")
+        return None
+
+async def get_authenticated_user_async(session):
+    """get_authenticated_user for async views, loading through their AsyncSession"""
+    try:
+        current_user_id = get_jwt_identity()
+        if not current_user_id:
+            return None
+        user_id = int(current_user_id)
+        
+        user, cached_at = _known_user(user_id)
+        if cached_at is not None and await session.scalar(_user_stamp_statement(user_id)) != cached_at:
+            user = None
+        if user is None:
+            db_user = await session.get(User, user_id)
+            if not db_user:
+                return None
+            user = _cache_user(db_user)
+        return user
+    except Exception:
+        logger.exception("Error getting current user")
+        return None
+
+def invalidate_cached_user(user_id):
+    """Drop a user from the authenticated-user cache"""
+    if has_app_context() and 'user_cache' in current_app.extensions:
+        current_app.extensions['user_cache'].pop(user_id)
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _user_row_changed(mapper, connection, target):
+    # Drop now, and again after commit so a concurrent request cannot
+    # re-cache the pre-commit row
+    invalidate_cached_user(target.id)
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('changed_user_ids', set()).add(target.id)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed_users(session):
+    for user_id in session.info.pop('changed_user_ids', ()):
+        invalidate_cached_user(user_id)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changed_users(session):
+    session.info.pop('changed_user_ids', None)
+
 def jwt_required_with_user(f):
-    """Custom decorator that requires JWT and returns current user"""
+    """Custom decorator that requires JWT and passes the authenticated user"""
     @wraps(f)
     @jwt_required()
     def decorated(*args, **kwargs):
-        current_user = get_current_user()
+        current_user = get_authenticated_user()
         if not current_user:
             return jsonify({'error': 'User not found'}), 404
+        if not current_user.is_active:
+            return jsonify({'error': 'Account is deactivated'}), 401
         return f(current_user, *args, **kwargs)
     return decorated
 
+def async_jwt_required(refresh=False):
+    """jwt_required for async views (flask_jwt_extended's runs coroutines on a new event loop)"""
+    def wrapper(f):
+        @wraps(f)
+        async def decorated(*args, **kwargs):
+            verify_jwt_in_request(refresh=refresh)
+            return await f(*args, **kwargs)
+        return decorated
+    return wrapper
+
+def async_jwt_required_with_user(f):
+    """jwt_required_with_user for async views, which take their AsyncSession first"""
+    @wraps(f)
+    @async_jwt_required()
+    async def decorated(session, *args, **kwargs):
+        current_user = await get_authenticated_user_async(session)
+        if not current_user:
+            return jsonify({'error': 'User not found'}), 404
+        if not current_user.is_active:
+            return jsonify({'error': 'Account is deactivated'}), 401
+        return await f(session, current_user, *args, **kwargs)
+    return decorated
+
 def validate_email(email):
     """Basic email validation"""
     import re
@@ -0,0 +1,98 @@
+import zlib
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:  # optional; br is simply not offered
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional; zstd is simply not offered
+    zstandard = None
+
+# Each factory returns (compress, flush, finish) for one response body. flush
+# emits everything compressed so far, so a streamed chunk reaches the client
+# without waiting for the next one
+def _gzip(config):
+    compressor = zlib.compressobj(config['COMPRESS_LEVEL'], zlib.DEFLATED, 31)
+    return compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+
+def _brotli(config):
+    compressor = brotli.Compressor(quality=config['COMPRESS_BR_LEVEL'])
+    return compressor.process, compressor.flush, compressor.finish
+
+def _zstd(config):
+    compressor = zstandard.ZstdCompressor(level=config['COMPRESS_ZSTD_LEVEL']).compressobj()
+    return (
+        compressor.compress,
+        lambda: compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK),
+        compressor.flush
+    )
+
+# In order of preference when the client accepts several equally
+ENCODERS = {'gzip': _gzip}
+if brotli is not None:
+    ENCODERS = {'br': _brotli, **ENCODERS}
+if zstandard is not None:
+    ENCODERS = {'zstd': _zstd, **ENCODERS}
+
+def init_app(app):
+    """Compress responses according to the request's Accept-Encoding"""
+    if app.config['COMPRESS_ENABLED']:
+        app.after_request(compress_response)
+
+def _compressible(response):
+    if response.direct_passthrough or 'Content-Encoding' in response.headers:
+        return False
+    if response.status_code < 200 or response.status_code in (204, 206, 304):
+        return False
+    return response.mimetype in current_app.config['COMPRESS_MIMETYPES']
+
+def _stream(chunks, iterable, encoder):
+    compress, flush, finish = encoder
+    try:
+        for chunk in chunks:
+            data = compress(chunk) + flush() if chunk else b''
+            if data:
+                yield data
+        yield finish()
+    finally:
+        # Response.close() now reaches this generator rather than the view's iterable
+        if hasattr(iterable, 'close'):
+            iterable.close()
+
+def compress_response(response):
+    """Encode the body with the best encoding the client accepts
+
+    Buffered bodies under COMPRESS_MIN_SIZE bytes are sent as they are;
+    streamed bodies are always compressed, chunk by chunk as they are
+    produced. A compressed response's ETag becomes weak, since its bytes
+    differ from the identity representation it was computed for.
+    """
+    if not _compressible(response):
+        return response
+    response.vary.add('Accept-Encoding')
+    if response.cache_control.no_transform:
+        return response
+
+    encoding = request.accept_encodings.best_match(list(ENCODERS))
+    if encoding is None:
+        return response
+    config = current_app.config
+    if not response.is_streamed and response.calculate_content_length() < config['COMPRESS_MIN_SIZE']:
+        return response
+
+    encoder = ENCODERS[encoding](config)
+    if response.is_streamed:
+        response.response = _stream(response.iter_encoded(), response.response, encoder)
+        response.headers.pop('Content-Length', None)
+    else:
+        compress, _, finish = encoder
+        response.set_data(compress(response.get_data()) + finish())
+
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
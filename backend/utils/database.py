@@ -0,0 +1,27 @@
+from sqlalchemy import event
+from models.models import db
+
+def set_sqlite_pragmas(engine, pragmas):
+    """Run the given PRAGMAs on every new connection of a SQLite engine"""
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+
+def init_app(app):
+    """Apply per-dialect connection settings to the app's engines (primary and replicas)
+
+    Pool sizing and PostgreSQL timeouts come from SQLALCHEMY_ENGINE_OPTIONS;
+    SQLite settings are per connection, so they are set by a connect hook
+    that must be registered before the first connection is opened.
+    """
+    with app.app_context():
+        for engine in db.engines.values():
+            set_sqlite_pragmas(engine, app.config.get('SQLITE_PRAGMAS'))
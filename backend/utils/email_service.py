@@ -1,20 +1,235 @@
-from flask_mail import Mail, Message
-from flask import current_app
+import logging
+from flask_mail import Mail, Message, BadHeaderError
+from sqlalchemy import select, insert, update, delete
+from models.models import OutboxMessage, db
+from datetime import datetime, timedelta
+import os
+import queue
+import smtplib
 import threading
+import time
+
+logger = logging.getLogger(__name__)
 
 mail = Mail()
 
-def send_async_email(app, msg):
-    """Send email asynchronously"""
-    with app.app_context():
+# Failures that retrying on a fresh connection cannot fix
+PERMANENT_ERRORS = (AssertionError, BadHeaderError, smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused)
+
+class EmailOutbox:
+    """Bounded queue of outgoing mail drained by a fixed pool of SMTP workers
+
+    Each worker takes a batch of queued messages and sends them over one
+    SMTP connection (mail.connect()), reconnecting with exponential backoff
+    when the connection fails. With MAIL_OUTBOX_DURABLE enabled, messages
+    are also written to the email_outbox table first, so anything queued
+    when a process dies is picked up again by the next worker that starts.
+    """
+    
+    def __init__(self, app=None):
+        self.app = None
+        self._queue = None
+        self._workers = []
+        self._pid = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        self.app = app
+        app.extensions['email_outbox'] = self
+    
+    @property
+    def durable(self):
+        return self.app.config['MAIL_OUTBOX_DURABLE']
+    
+    def _ensure_started(self):
+        # Workers are started lazily, and again in each forked gunicorn worker
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            config = self.app.config
+            self._queue = queue.Queue(maxsize=config['MAIL_OUTBOX_MAXSIZE'])
+            self._workers = [
+                threading.Thread(target=self._run, args=(i == 0,), name=f'email-outbox-{i}', daemon=True)
+                for i in range(config['MAIL_OUTBOX_WORKERS'])
+            ]
+            self._pid = os.getpid()
+            for worker in self._workers:
+                worker.start()
+    
+    def enqueue(self, msg, wait=0):
+        """Queue a message for delivery, waiting up to wait seconds for room; returns False if it was dropped"""
+        self._ensure_started()
+        outbox_id = self._persist(msg) if self.durable else None
         try:
-            mail.send(msg)
-            print(f"Email sent successfully to {msg.recipients}")
-        except Exception as e:
-            print(f"Failed to send email: {e}")
+            self._queue.put((msg, outbox_id), block=wait > 0, timeout=wait or None)
+            return True
+        except queue.Full:
+            # A durable message stays pending in the table and is retried later
+            logger.warning('Email outbox full, %s message to %s', 'deferring' if outbox_id else 'dropping', msg.recipients)
+            return outbox_id is not None
+    
+    def qsize(self):
+        """Number of messages waiting in this process's queue"""
+        return self._queue.qsize() if self._queue is not None and self._pid == os.getpid() else 0
+    
+    def shutdown(self, timeout=None):
+        """Send everything already queued, then stop the workers"""
+        if self._pid != os.getpid():
+            return
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join(timeout)
+        self._pid = None
+    
+    def _run(self, recover):
+        batch_size = self.app.config['MAIL_OUTBOX_BATCH_SIZE']
+        poll_seconds = self.app.config['MAIL_OUTBOX_POLL_SECONDS']
+        # One worker per process re-queues durable rows, at start and when idle
+        recover = recover and self.durable
+        if recover:
+            self._recover()
+        
+        while True:
+            try:
+                item = self._queue.get(timeout=poll_seconds)
+            except queue.Empty:
+                if recover:
+                    self._recover()
+                continue
+            if item is None:
+                return
+            
+            # Drain whatever else is already waiting into the same connection
+            batch, stop = [item], False
+            while len(batch) < batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            
+            with self.app.app_context():
+                self._send_batch(batch)
+            if stop:
+                return
+    
+    def _send_batch(self, batch):
+        config = self.app.config
+        pending = [(msg, outbox_id, 0) for msg, outbox_id in batch
+                   if outbox_id is None or self._claim(outbox_id)]
+        
+        while pending:
+            retry = []
+            try:
+                with mail.connect() as conn:
+                    while pending:
+                        msg, outbox_id, attempts = pending[0]
+                        try:
+                            conn.send(msg)
+                        except PERMANENT_ERRORS as e:
+                            logger.error('Failed to send email to %s: %s', msg.recipients, e)
+                            self._mark_failed(outbox_id, e, attempts + 1)
+                            pending.pop(0)
+                            continue
+                        pending.pop(0)
+                        self._mark_sent(outbox_id)
+            except Exception as e:
+                # Connection-level failure: retry the rest on a fresh connection
+                for msg, outbox_id, attempts in pending:
+                    if attempts + 1 >= config['MAIL_MAX_RETRIES']:
+                        logger.error('Giving up on email to %s: %s', msg.recipients, e)
+                        self._mark_failed(outbox_id, e, attempts + 1)
+                    else:
+                        retry.append((msg, outbox_id, attempts + 1))
+                if retry:
+                    time.sleep(config['MAIL_RETRY_BACKOFF'] * 2 ** (retry[0][2] - 1))
+            pending = retry
+    
+    # Durable outbox table helpers (no-ops for in-memory messages)
+    
+    def _persist(self, msg):
+        with db.engine.begin() as conn:
+            return conn.execute(insert(OutboxMessage.__table__).values(
+                subject=msg.subject,
+                sender=msg.sender if isinstance(msg.sender, str) else None,
+                recipients=','.join(msg.recipients),
+                body=msg.body,
+                html=msg.html,
+                status='pending',
+                attempts=0,
+                created_at=datetime.utcnow(),
+                updated_at=datetime.utcnow()
+            )).inserted_primary_key[0]
+    
+    def _claim(self, outbox_id):
+        """Mark a pending row as sending; False if another worker got it first"""
+        table = OutboxMessage.__table__
+        with db.engine.begin() as conn:
+            result = conn.execute(
+                update(table)
+                .where(table.c.id == outbox_id, table.c.status == 'pending')
+                .values(status='sending', updated_at=datetime.utcnow())
+            )
+        return result.rowcount == 1
+    
+    def _mark_sent(self, outbox_id):
+        if outbox_id is None:
+            return
+        table = OutboxMessage.__table__
+        with db.engine.begin() as conn:
+            conn.execute(delete(table).where(table.c.id == outbox_id))
+    
+    def _mark_failed(self, outbox_id, error, attempts):
+        if outbox_id is None:
+            return
+        table = OutboxMessage.__table__
+        with db.engine.begin() as conn:
+            conn.execute(
+                update(table).where(table.c.id == outbox_id)
+                .values(status='failed', attempts=attempts, last_error=str(error), updated_at=datetime.utcnow())
+            )
+    
+    def _recover(self):
+        """Queue pending rows, plus rows stuck in 'sending' by a worker that died"""
+        table = OutboxMessage.__table__
+        stale_before = datetime.utcnow() - timedelta(seconds=self.app.config['MAIL_OUTBOX_STALE_SECONDS'])
+        try:
+            with self.app.app_context(), db.engine.begin() as conn:
+                conn.execute(
+                    update(table)
+                    .where(table.c.status == 'sending', table.c.updated_at < stale_before)
+                    .values(status='pending')
+                )
+                rows = conn.execute(
+                    select(table).where(table.c.status == 'pending')
+                    .order_by(table.c.id).limit(self._queue.maxsize // 2 or 1)
+                ).all()
+                for row in rows:
+                    msg = Message(
+                        subject=row.subject,
+                        recipients=row.recipients.split(','),
+                        body=row.body,
+                        html=row.html,
+                        sender=row.sender
+                    )
+                    self._queue.put_nowait((msg, row.id))
+        except queue.Full:
+            pass
+        except Exception:
+            logger.exception('Failed to recover email outbox')
 
-def send_email(subject, recipients, text_body=None, html_body=None):
-    """Send email with both text and HTML body"""
+outbox = EmailOutbox()
+
+def send_email(subject, recipients, text_body=None, html_body=None, wait=0):
+    """Send email with both text and HTML body (wait: seconds to wait for outbox room)"""
     try:
         msg = Message(
             subject=subject,
@@ -23,15 +238,10 @@ def send_email(subject, recipients, text_body=None, html_body=None):
             html=html_body
         )
         
-        # Send email in background thread
-        thread = threading.Thread(
-            target=send_async_email,
-            args=(current_app._get_current_object(), msg)
-        )
-        thread.start()
-        return True
-    except Exception as e:
-        print(f"Error preparing email: {e}")
+        # Hand off to the outbox worker pool
+        return outbox.enqueue(msg, wait=wait)
+    except Exception:
+        logger.exception("Error preparing email")
         return False
 
 def send_todo_notification(user_email, user_name, todo_title, todo_description=None):
@@ -84,6 +294,66 @@ def send_todo_notification(user_email, user_name, todo_title, todo_description=N
     
     return send_email(subject, user_email, text_body, html_body)
 
+def send_todo_digest(user_email, user_name, todos, more=0):
+    """Send one email summarizing several newly created TODOs
+
+    todos is a list of (title, description); more counts further todos
+    created in the same window but left out of the list.
+    """
+    total = len(todos) + more
+    subject = f"{total} New TODOs Created"
+    
+    # Text version
+    items = '\n'.join(f"      - {title}" + (f": {description}" if description else '') for title, description in todos)
+    text_body = f"""
+    Hi {user_name},
+    
+    You've created {total} new TODO items:
+    
+{items}
+    {f'  ...and {more} more.' if more else ''}
+    
+    You can manage your TODOs by logging into your account.
+    
+    Best regards,
+    TODO App Team
+    """
+    
+    # HTML version
+    html_items = ''.join(
+        f"<li><strong>{title}</strong>" + (f" &ndash; {description}" if description else '') + "</li>"
+        for title, description in todos
+    )
+    html_body = f"""
+    <html>
+    <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+        <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
+            <h2 style="color: #4CAF50;">{total} New TODOs Created! 📝</h2>
+            
+            <p>Hi <strong>{user_name}</strong>,</p>
+            
+            <p>You've created {total} new TODO items:</p>
+            
+            <div style="background-color: #f5f5f5; padding: 15px; border-radius: 5px; margin: 20px 0;">
+                <ul style="padding-left: 20px; margin: 0;">{html_items}</ul>
+                {f'<p style="margin-bottom: 0;">...and {more} more.</p>' if more else ''}
+            </div>
+            
+            <p>You can manage your TODOs by logging into your account.</p>
+            
+            <div style="margin-top: 30px; padding-top: 20px; border-top: 1px solid #eee;">
+                <p style="color: #666; font-size: 14px;">
+                    Best regards,<br>
+                    TODO App Team
+                </p>
+            </div>
+        </div>
+    </body>
+    </html>
+    """
+    
+    return send_email(subject, user_email, text_body, html_body)
+
 def send_welcome_email(user_email, user_name):
     """Send welcome email to new users"""
     subject = "Welcome to TODO App! 🎉"
@@ -142,3 +412,67 @@ def send_welcome_email(user_email, user_name):
     """
     
     return send_email(subject, user_email, text_body, html_body)
+
+def send_reminder_digest(user_email, user_name, due_soon, overdue, more=0, wait=0):
+    """Send one email listing a user's todos that are due soon or overdue
+
+    due_soon and overdue are lists of (title, due_date); more counts the
+    todos left out of the lists.
+    """
+    total = len(due_soon) + len(overdue) + more
+    subject = f"TODO Reminder: {total} {'todo needs' if total == 1 else 'todos need'} your attention"
+    
+    def text_list(todos):
+        return '\n'.join(f"      - {title} (due {due_date:%Y-%m-%d %H:%M} UTC)" for title, due_date in todos)
+    
+    def html_list(heading, color, todos):
+        if not todos:
+            return ''
+        items = ''.join(f"<li><strong>{title}</strong> &ndash; due {due_date:%Y-%m-%d %H:%M} UTC</li>" for title, due_date in todos)
+        return f"""
+            <div style="background-color: #f5f5f5; padding: 15px; border-radius: 5px; margin: 20px 0;">
+                <h3 style="margin-top: 0; color: {color};">{heading}</h3>
+                <ul style="padding-left: 20px; margin-bottom: 0;">{items}</ul>
+            </div>
+        """
+    
+    # Text version
+    text_body = f"""
+    Hi {user_name},
+    
+    {f'Overdue:{chr(10)}{text_list(overdue)}{chr(10)}' if overdue else ''}
+    {f'Due soon:{chr(10)}{text_list(due_soon)}{chr(10)}' if due_soon else ''}
+    {f'...and {more} more.' if more else ''}
+    
+    You can manage your TODOs by logging into your account.
+    
+    Best regards,
+    TODO App Team
+    """
+    
+    # HTML version
+    html_body = f"""
+    <html>
+    <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+        <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
+            <h2 style="color: #4CAF50;">TODO Reminder ⏰</h2>
+            
+            <p>Hi <strong>{user_name}</strong>,</p>
+            {html_list('⚠️ Overdue', '#d32f2f', overdue)}
+            {html_list('📅 Due soon', '#333', due_soon)}
+            {f'<p>...and {more} more.</p>' if more else ''}
+            
+            <p>You can manage your TODOs by logging into your account.</p>
+            
+            <div style="margin-top: 30px; padding-top: 20px; border-top: 1px solid #eee;">
+                <p style="color: #666; font-size: 14px;">
+                    Best regards,<br>
+                    TODO App Team
+                </p>
+            </div>
+        </div>
+    </body>
+    </html>
+    """
+    
+    return send_email(subject, user_email, text_body, html_body, wait=wait)
@@ -1,20 +1,87 @@
+import logging
 from google.auth.transport import requests
 from google.oauth2 import id_token
-import requests as http_requests
+from requests.adapters import HTTPAdapter
 from flask import current_app
+from utils.cache import TTLCache
+import requests as http_requests
+import hashlib
+import os
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_ISSUERS = ['accounts.google.com', 'https://accounts.google.com']
+
+# Process-wide caches: signing certs (by URL) and already-verified ID tokens
+_cert_cache = TTLCache(maxsize=16, ttl=3600)
+_token_cache = TTLCache(maxsize=1024, ttl=300)
+
+_session_lock = threading.Lock()
+_session = None  # (pid, requests.Session)
+
+def get_http_session():
+    """Shared pooled HTTP session (one per process) for calls to Google"""
+    global _session
+    session = _session
+    if session is None or session[0] != os.getpid():
+        with _session_lock:
+            session = _session
+            if session is None or session[0] != os.getpid():
+                http = http_requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=4,
+                    pool_maxsize=current_app.config['GOOGLE_HTTP_POOL_SIZE'],
+                    max_retries=1
+                )
+                http.mount('https://', adapter)
+                http.mount('http://', adapter)
+                session = (os.getpid(), http)
+                _session = session
+    return session[1]
+
+def _max_age(cache_control):
+    match = re.search(r'max-age=(\d+)', cache_control or '')
+    return int(match.group(1)) if match else 0
+
+class CachingRequest(requests.Request):
+    """google-auth transport that reuses the pooled session and caches GETs per Cache-Control max-age"""
+    
+    def __call__(self, url, method='GET', body=None, headers=None, timeout=None, **kwargs):
+        timeout = timeout or current_app.config['GOOGLE_HTTP_TIMEOUT']
+        if method != 'GET' or body is not None:
+            return super().__call__(url, method=method, body=body, headers=headers, timeout=timeout, **kwargs)
+        
+        response = _cert_cache.get(url)
+        if response is None:
+            response = super().__call__(url, method=method, headers=headers, timeout=timeout, **kwargs)
+            max_age = _max_age(response.headers.get('Cache-Control'))
+            if response.status == 200 and max_age:
+                response.data  # read the body now so the cached response is self-contained
+                _cert_cache.set(url, response, ttl=max_age)
+        return response
 
 def verify_google_token(token):
     """Verify Google OAuth token and return user info"""
     try:
-        # Verify the token
-        idinfo = id_token.verify_oauth2_token(
+        client_id = current_app.config['GOOGLE_CLIENT_ID']
+        cache_key = hashlib.sha256(f'{client_id}:{token}'.encode('utf-8')).hexdigest()
+        user_info = _token_cache.get(cache_key)
+        if user_info is not None:
+            return user_info
+        
+        # Verify the token (certs come from cache, so this is normally local crypto)
+        idinfo = id_token.verify_token(
             token, 
-            requests.Request(), 
-            current_app.config['GOOGLE_CLIENT_ID']
+            CachingRequest(get_http_session()), 
+            audience=client_id,
+            certs_url=current_app.config['GOOGLE_CERTS_URL']
         )
         
         # Check if token is valid and from correct issuer
-        if idinfo['iss'] not in ['accounts.google.com', 'https://accounts.google.com']:
+        if idinfo['iss'] not in GOOGLE_ISSUERS:
             raise ValueError('Wrong issuer.')
         
         # Extract user information
@@ -27,21 +94,26 @@ def verify_google_token(token):
             'email_verified': idinfo.get('email_verified', False)
         }
         
+        # Remember the verification until the token itself expires
+        ttl = min(current_app.config['GOOGLE_TOKEN_CACHE_TTL'], idinfo.get('exp', 0) - time.time())
+        _token_cache.set(cache_key, user_info, ttl=ttl)
+        
         return user_info
         
     except ValueError as e:
-        print(f"Token verification failed: {e}")
+        logger.info('Google token verification failed: %s', e)
         return None
-    except Exception as e:
-        print(f"Error verifying Google token: {e}")
+    except Exception:
+        logger.exception("Error verifying Google token")
         return None
 
 def get_google_user_info(access_token):
     """Get user info from Google using access token"""
     try:
-        response = http_requests.get(
+        response = get_http_session().get(
             'https://www.googleapis.com/oauth2/v2/userinfo',
-            headers={'Authorization': f'Bearer {access_token}'}
+            headers={'Authorization': f'Bearer {access_token}'},
+            timeout=current_app.config['GOOGLE_HTTP_TIMEOUT']
         )
         
         if response.status_code == 200:
@@ -55,9 +127,9 @@ def get_google_user_info(access_token):
                 'email_verified': user_data.get('verified_email', False)
             }
         else:
-            print(f"Failed to get user info: {response.status_code}")
+            logger.warning('Failed to get Google user info: %s', response.status_code)
             return None
             
-    except Exception as e:
-        print(f"Error getting Google user info: {e}")
+    except Exception:
+        logger.exception("Error getting Google user info")
         return None
@@ -0,0 +1,36 @@
+import hashlib
+from flask import request, make_response
+
+def make_etag(*parts):
+    """Strong ETag value derived from the given parts"""
+    return hashlib.sha1(':'.join(str(p) for p in parts).encode('utf-8')).hexdigest()
+
+def request_args_key():
+    """Order-independent representation of the query string, for collection ETags"""
+    return '&'.join(f'{k}={v}' for k, v in sorted(request.args.items(multi=True)))
+
+def is_conditional():
+    return bool(request.if_none_match) or request.if_modified_since is not None
+
+def is_not_modified(etag, last_modified=None):
+    """True when the request's validators show the client already has this representation"""
+    if request.if_none_match:
+        # If-None-Match takes precedence over If-Modified-Since, and uses weak
+        # comparison (RFC 9110): compressed responses carry the ETag as W/"..."
+        return request.if_none_match.contains_weak(etag)
+    if last_modified is not None and request.if_modified_since is not None:
+        return last_modified.replace(microsecond=0, tzinfo=None) <= request.if_modified_since.replace(tzinfo=None)
+    return False
+
+def with_validators(response, etag, last_modified=None):
+    """Attach ETag / Last-Modified to a response (accepts the (body, status) tuple views return)"""
+    response = make_response(response)
+    if response.status_code not in (200, 304):
+        return response
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    return response
+
+def not_modified(etag, last_modified=None):
+    return with_validators(('', 304), etag, last_modified)
@@ -0,0 +1,225 @@
+import csv
+import io
+import json
+import time
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import insert
+from models.models import Todo, db
+from utils.validation import validate_new_todo
+from utils.versioning import bump_todos_version
+from utils.stats import invalidate_todo_stats
+
+IMPORT_FORMATS = ['json', 'ndjson', 'csv']
+
+# Columns written by an import, in COPY order
+IMPORT_COLUMNS = ('title', 'description', 'priority', 'due_date', 'completed',
+                  'completed_at', 'created_at', 'updated_at', 'user_id', 'change_seq')
+
+def format_from_mimetype(mimetype):
+    """Guess the import format from a Content-Type, defaulting to NDJSON"""
+    if mimetype == 'application/json':
+        return 'json'
+    if mimetype in ['text/csv', 'application/csv']:
+        return 'csv'
+    return 'ndjson'
+
+def iter_json_array(stream, chunk_size=64 * 1024):
+    """Yield the items of a top-level JSON array without loading the whole document"""
+    decoder = json.JSONDecoder()
+    reader = io.TextIOWrapper(stream, encoding='utf-8')
+    buffer = reader.read(chunk_size).lstrip()
+    if not buffer.startswith('['):
+        raise ValueError('Expected a JSON array')
+    pos, eof = 1, False
+
+    while True:
+        # Skip separators, reading more input when the buffer runs out
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos < len(buffer) or eof:
+                break
+            more = reader.read(chunk_size)
+            eof = not more
+            buffer, pos = buffer[pos:] + more, 0
+
+        if pos >= len(buffer):
+            raise ValueError('Unterminated JSON array')
+        if buffer[pos] == ']':
+            return
+
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            # The item continues past the end of the buffer
+            more = reader.read(chunk_size)
+            eof = not more
+            buffer, pos = buffer[pos:] + more, 0
+            continue
+
+        yield item
+        pos = end
+        if pos > chunk_size:
+            buffer, pos = buffer[pos:], 0
+
+def iter_ndjson(stream):
+    """Yield one JSON value per non-blank line (invalid lines yield the error instead)"""
+    for line in io.TextIOWrapper(stream, encoding='utf-8'):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield e
+
+def iter_csv(stream):
+    """Yield one dict per CSV row, keyed by the header row"""
+    yield from csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8', newline=''))
+
+class _RawReader(io.RawIOBase):
+    """io adapter for input streams that only implement read(), like gunicorn's request body"""
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._stream.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+def iter_records(stream, import_format):
+    if not isinstance(stream, io.IOBase):
+        stream = io.BufferedReader(_RawReader(stream))
+    if import_format == 'json':
+        return iter_json_array(stream)
+    if import_format == 'csv':
+        return iter_csv(stream)
+    return iter_ndjson(stream)
+
+def _parse_completed(value):
+    """JSON booleans, CSV strings or 0/1; raises ValueError for anything else"""
+    if isinstance(value, str):
+        return value.strip().lower() in ['true', '1', 'yes']
+    if value is None or isinstance(value, bool) or value in (0, 1):
+        return bool(value)
+    raise ValueError('completed must be true or false')
+
+def _build_row(record, user_id, now):
+    """Validate one record into an insert row, returning (row, error)"""
+    if isinstance(record, Exception):
+        return None, f'Invalid JSON: {record}'
+    if not isinstance(record, dict):
+        return None, 'Record must be an object'
+
+    # A field of the wrong type rejects this record only, never the import
+    try:
+        fields, error = validate_new_todo(record)
+        if error:
+            return None, error
+        completed = _parse_completed(record.get('completed', False))
+    except (TypeError, ValueError, AttributeError) as e:
+        return None, str(e)
+    return dict(
+        fields,
+        completed=completed,
+        completed_at=now if completed else None,
+        created_at=now,
+        updated_at=now,
+        user_id=user_id
+    ), None
+
+def _insert_rows(rows):
+    """Insert a batch with COPY on PostgreSQL, executemany elsewhere"""
+    connection = db.session.connection()
+    if connection.dialect.name == 'postgresql':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([row[column] for column in IMPORT_COLUMNS])
+        buffer.seek(0)
+        cursor = connection.connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY todos ({', '.join(IMPORT_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer
+            )
+        finally:
+            cursor.close()
+    else:
+        db.session.execute(insert(Todo), rows)
+
+def iter_import(user_id, records, batch_size=None, max_errors=None):
+    """Validate and insert records for a user in committed batches
+
+    Yields the running report after every committed batch; the final yield
+    is the complete summary (with 'done': True). No notification emails are
+    sent.
+    """
+    batch_size = batch_size or current_app.config['IMPORT_BATCH_SIZE']
+    max_errors = current_app.config['IMPORT_MAX_ERRORS'] if max_errors is None else max_errors
+    started = time.perf_counter()
+    report = {'received': 0, 'imported': 0, 'rejected': 0, 'batches': 0, 'errors': []}
+
+    def flush(rows):
+        version = bump_todos_version(user_id)
+        for row in rows:
+            row['change_seq'] = version
+        _insert_rows(rows)
+        db.session.commit()
+        report['imported'] += len(rows)
+        report['batches'] += 1
+        report['elapsed_seconds'] = round(time.perf_counter() - started, 3)
+
+    rows = []
+    now = datetime.utcnow()
+    records = iter(records)
+    number = 0
+    try:
+        while True:
+            try:
+                record = next(records)
+            except StopIteration:
+                break
+            except (ValueError, csv.Error) as e:
+                # The input itself is malformed; keep what was already committed
+                report['aborted'] = f'Malformed input after record {number}: {e}'
+                break
+            number += 1
+            report['received'] += 1
+            row, error = _build_row(record, user_id, now)
+            if error:
+                report['rejected'] += 1
+                if len(report['errors']) < max_errors:
+                    report['errors'].append({'record': number, 'error': error})
+                continue
+            rows.append(row)
+            if len(rows) >= batch_size:
+                flush(rows)
+                rows = []
+                now = datetime.utcnow()
+                yield report
+        if rows:
+            flush(rows)
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        if report['imported']:
+            invalidate_todo_stats(user_id)
+
+    report['elapsed_seconds'] = round(time.perf_counter() - started, 3)
+    report['done'] = True
+    yield report
+
+def import_todos(user_id, records, batch_size=None, max_errors=None):
+    """Run an import to completion and return its summary report"""
+    report = None
+    for report in iter_import(user_id, records, batch_size, max_errors):
+        pass
+    return report
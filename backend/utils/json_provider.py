@@ -0,0 +1,50 @@
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional speedup; the stdlib encoder is used instead
+    orjson = None
+
+class FastJSONProvider(DefaultJSONProvider):
+    """DefaultJSONProvider that encodes with orjson when it is installed
+
+    The bytes match the stdlib encoder's: sorted keys, compact separators
+    (indent=2 in debug), and anything orjson does not handle natively -
+    datetimes included - goes through Flask's default() hook. Payloads the
+    stdlib would write differently (non-ASCII text under ensure_ascii,
+    non-string keys, out-of-range ints) are re-encoded with the stdlib.
+    """
+
+    def _orjson_dumps(self, obj, indent):
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        try:
+            data = orjson.dumps(obj, default=self.default, option=option)
+        except (orjson.JSONEncodeError, TypeError):
+            return None
+        if self.ensure_ascii and not data.isascii():
+            return None
+        return data
+
+    def _encode(self, obj, indent):
+        """Encode obj as UTF-8 JSON bytes"""
+        if orjson is not None:
+            data = self._orjson_dumps(obj, indent)
+            if data is not None:
+                return data
+        dump_args = {'indent': 2} if indent else {'separators': (',', ':')}
+        return super().dumps(obj, **dump_args).encode('utf-8')
+
+    def dumps(self, obj, **kwargs):
+        # Only the argument sets response() itself uses have an exact orjson equivalent
+        if orjson is not None and kwargs in ({'separators': (',', ':')}, {'indent': 2}):
+            return self._encode(obj, 'indent' in kwargs).decode('utf-8')
+        return super().dumps(obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(self._encode(obj, indent) + b'\n', mimetype=self.mimetype)
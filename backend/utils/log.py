@@ -0,0 +1,172 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from utils.json_provider import FastJSONProvider
+
+# Attributes every LogRecord has; anything else was passed via extra=
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+def _extra_fields(record):
+    return {key: value for key, value in vars(record).items()
+            if key not in _RECORD_ATTRS and not key.startswith('_')}
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including any extra= fields"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        entry.update(_extra_fields(record))
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class TextFormatter(logging.Formatter):
+    """Plain log lines with any extra= fields appended as key=value"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s [%(name)s] %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        extra = ' '.join(f'{key}={value}' for key, value in _extra_fields(record).items())
+        return f'{line} {extra}' if extra else line
+
+_handler = logging.StreamHandler(sys.stdout)
+_listener = None
+
+def _start_listener(log_queue):
+    global _listener
+    _listener = logging.handlers.QueueListener(log_queue, _handler, respect_handler_level=True)
+    _listener.start()
+
+def _stop_listener():
+    if _listener is not None:
+        _listener.stop()
+
+def parse_levels(spec):
+    """Parse 'routes.todos=DEBUG,utils.email_service=WARNING' into a dict"""
+    levels = {}
+    for item in (spec or '').split(','):
+        if '=' in item:
+            name, level = item.split('=', 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+def configure_logging(app):
+    """Route all logging through a queue so request threads never block on stdout
+
+    Records are formatted (JSON or text) and written by a listener thread,
+    which is restarted in forked gunicorn workers. Calling this again (e.g.
+    for a second app) only updates the format and levels.
+    """
+    _handler.setFormatter(JsonFormatter() if app.config['LOG_FORMAT'] == 'json' else TextFormatter())
+    root = logging.getLogger()
+    root.setLevel(app.config['LOG_LEVEL'])
+    for name, level in parse_levels(app.config['LOG_LEVELS']).items():
+        logging.getLogger(name).setLevel(level)
+
+    if _listener is None:
+        log_queue = queue.SimpleQueue()
+        root.handlers = [logging.handlers.QueueHandler(log_queue)]
+        _start_listener(log_queue)
+        os.register_at_fork(after_in_child=lambda: _start_listener(log_queue))
+        atexit.register(_stop_listener)
+
+class TimedJSONProvider(FastJSONProvider):
+    """JSON provider that adds serialization time to sampled requests"""
+
+    def _timed(self, encode, *args, **kwargs):
+        timing = g.get('_timing') if has_request_context() else None
+        if timing is None:
+            return encode(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return encode(*args, **kwargs)
+        finally:
+            timing['serialize'] += time.perf_counter() - started
+
+    def dumps(self, obj, **kwargs):
+        return self._timed(super().dumps, obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        return self._timed(super().response, *args, **kwargs)
+
+def request_db_stats():
+    """DB time and statement count accumulated by the current request"""
+    return g.get('_db') if has_request_context() else None
+
+def init_request_timing(app, db):
+    """Count every request's SQL statements and DB time, and log a sample
+
+    The per-request DB figures (request_db_stats()) are always collected so
+    metrics can use them; LOG_REQUEST_SAMPLE_RATE is the fraction of
+    requests additionally logged with total / DB / serialization time.
+    """
+    logger = logging.getLogger('request')
+    app.json = TimedJSONProvider(app)
+
+    @app.before_request
+    def start_timing():
+        g._db = {'time': 0.0, 'queries': 0}
+        rate = app.config['LOG_REQUEST_SAMPLE_RATE']
+        if rate and (rate >= 1 or random.random() < rate):
+            g._timing = {'start': time.perf_counter(), 'serialize': 0.0}
+
+    @app.after_request
+    def log_timing(response):
+        timing = g.pop('_timing', None)
+        if timing is not None:
+            stats = g.get('_db') or {'time': 0.0, 'queries': 0}
+            logger.info('request', extra={
+                'method': request.method,
+                'path': request.path,
+                'endpoint': request.endpoint,
+                'status': response.status_code,
+                'total_ms': round((time.perf_counter() - timing['start']) * 1000, 2),
+                'db_ms': round(stats['time'] * 1000, 2),
+                'db_queries': stats['queries'],
+                'serialize_ms': round(timing['serialize'] * 1000, 2),
+            })
+        return response
+
+    with app.app_context():
+        engines = list(db.engines.values())
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get('query_start')
+        if not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        stats = request_db_stats()
+        if stats is not None:
+            stats['time'] += elapsed
+            stats['queries'] += 1
+
+    def handle_error(context):
+        # The statement failed, so after_cursor_execute will not run
+        starts = context.connection.info.get('query_start') if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+    # Replica reads count towards the request like primary ones
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+        event.listen(engine, 'handle_error', handle_error)
@@ -0,0 +1,365 @@
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from flask import g, request, request_finished, request_started
+from sqlalchemy import event
+from utils.log import request_db_stats
+
+try:
+    import fcntl
+except ImportError:  # Windows: no multi-worker server, so nothing to lock against
+    fcntl = None
+
+# Upper bounds (seconds) for request latency and per-request DB time
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Upper bounds for SQL statements issued by one request
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+# Upper bounds (seconds) for a gunicorn worker's time from fork to serving
+BOOT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    'http_requests_total': ('counter', 'Requests handled, by endpoint and status'),
+    'http_request_duration_seconds': ('histogram', 'Time to produce a response'),
+    'db_queries_per_request': ('histogram', 'SQL statements executed per request'),
+    'db_query_duration_seconds_per_request': ('histogram', 'Total SQL time per request'),
+    'worker_boot_seconds': ('histogram', 'Time from fork until a gunicorn worker serves requests'),
+    'db_pool_checkouts_total': ('counter', 'Connections checked out of the pool'),
+    'db_pool_connections_total': ('counter', 'New DB connections opened by the pool'),
+    'db_pool_checked_out': ('gauge', 'Connections currently checked out'),
+    'db_pool_size': ('gauge', 'Configured pool size'),
+    'db_pool_idle': ('gauge', 'Open connections waiting in the pool'),
+    'email_outbox_queue_depth': ('gauge', 'Emails waiting in the in-process outbox'),
+}
+
+# METRICS_DIR file holding the summed counters of workers that have exited
+EXITED_FILE = 'exited_workers.json'
+# Snapshot tokens remembered in EXITED_FILE, so a fold interrupted before
+# deleting its inputs never counts them twice
+FOLDED_TOKENS_KEPT = 1000
+
+class MetricsRegistry:
+    """Counters and histograms for one process
+
+    Series are keyed by (name, labels) where labels is a sorted tuple of
+    (key, value) pairs. A histogram value is [bucket counts..., +Inf count, sum].
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.token = uuid.uuid4().hex
+        self.counters = {}
+        self.histograms = {}
+        self.buckets = {}
+
+    def inc(self, name, labels=(), amount=1):
+        key = (name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, buckets, labels=()):
+        key = (name, labels)
+        with self._lock:
+            series = self.histograms.get(key)
+            if series is None:
+                self.buckets[name] = buckets
+                series = self.histograms[key] = [0] * (len(buckets) + 2)
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            else:
+                series[len(buckets)] += 1
+            series[-1] += value
+
+    def snapshot(self):
+        """JSON-safe copy of every series"""
+        with self._lock:
+            return {
+                'token': self.token,
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, list(labels), list(series)] for (name, labels), series in self.histograms.items()],
+                'buckets': {name: list(bounds) for name, bounds in self.buckets.items()},
+            }
+
+def _labels(**labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def _sum_snapshots(snapshots):
+    """Counters, histograms and bucket bounds of several snapshots added together"""
+    counters, histograms, buckets = {}, {}, {}
+    for data in snapshots:
+        for name, labels, value in data['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        buckets.update(data['buckets'])
+        for name, labels, series in data['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            total = histograms.setdefault(key, [0] * len(series))
+            for i, value in enumerate(series):
+                total[i] += value
+    return counters, histograms, buckets
+
+def _write_json(path, data):
+    # Write then rename so readers never see a partial file
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (ValueError, OSError):
+        return None
+
+class Metrics:
+    """Prometheus metrics for requests, SQL, worker boots, the connection pool and the email outbox
+
+    Each process records into its own registry. With METRICS_DIR set, every
+    process also writes its snapshot to METRICS_DIR/metrics_<pid>.json (at
+    most every METRICS_FLUSH_INTERVAL seconds), and /metrics sums the
+    snapshots of all gunicorn workers. When a worker has exited, the next
+    scrape adds its counters and histograms into METRICS_DIR/exited_workers.json
+    and deletes its file, so totals never go backwards and the directory
+    does not grow as max_requests recycles workers; gauges only count live
+    workers. A new process that reuses an exited worker's pid folds the old
+    file the same way before writing its own.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.registry = MetricsRegistry()
+        self._pid = os.getpid()
+        self._flushed_at = 0.0
+        self._claimed = False
+
+    def init_app(self, app, db):
+        self.app = app
+        app.extensions['metrics'] = self
+        metrics_dir = app.config['METRICS_DIR']
+        if metrics_dir:
+            os.makedirs(metrics_dir, exist_ok=True)
+
+        request_started.connect(self._request_started, app)
+        request_finished.connect(self._request_finished, app)
+
+        with app.app_context():
+            # Pool gauges describe the primary; counters include replica pools
+            self.engine = db.engine
+            engines = list(db.engines.values())
+        for engine in engines:
+            event.listen(engine, 'checkout', self._pool_checkout)
+            event.listen(engine, 'connect', self._pool_connect)
+
+    def _registry(self):
+        # A forked worker starts counting from zero rather than re-reporting its parent's figures
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self.registry = MetricsRegistry()
+            self._flushed_at = 0.0
+            self._claimed = False
+        return self.registry
+
+    def _pool_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        self._registry().inc('db_pool_checkouts_total')
+
+    def _pool_connect(self, dbapi_connection, connection_record):
+        self._registry().inc('db_pool_connections_total')
+
+    def observe_worker_boot(self, seconds):
+        self._registry().observe('worker_boot_seconds', seconds, BOOT_BUCKETS)
+        self._maybe_flush(force=True)
+
+    def _request_started(self, sender, **extra):
+        g._metrics_start = time.perf_counter()
+
+    def _request_finished(self, sender, response, **extra):
+        started = g.get('_metrics_start')
+        if started is None:
+            return
+        registry = self._registry()
+        endpoint = request.endpoint or 'unmatched'
+        registry.inc('http_requests_total', _labels(
+            method=request.method, endpoint=endpoint, status=response.status_code
+        ))
+        registry.observe('http_request_duration_seconds', time.perf_counter() - started,
+                         DURATION_BUCKETS, _labels(method=request.method, endpoint=endpoint))
+        stats = request_db_stats()
+        if stats is not None:
+            labels = _labels(endpoint=endpoint)
+            registry.observe('db_queries_per_request', stats['queries'], QUERY_COUNT_BUCKETS, labels)
+            registry.observe('db_query_duration_seconds_per_request', stats['time'], DURATION_BUCKETS, labels)
+        self._maybe_flush()
+
+    def _gauges(self):
+        pool = self.engine.pool
+        gauges = {}
+        for name, attr in [('db_pool_checked_out', 'checkedout'), ('db_pool_size', 'size'),
+                           ('db_pool_idle', 'checkedin')]:
+            if hasattr(pool, attr):
+                gauges[name] = getattr(pool, attr)()
+        outbox = self.app.extensions.get('email_outbox')
+        if outbox is not None:
+            gauges['email_outbox_queue_depth'] = outbox.qsize()
+        return gauges
+
+    def _path(self, pid):
+        return os.path.join(self.app.config['METRICS_DIR'], f'metrics_{pid}.json')
+
+    def flush(self):
+        """Write this process's snapshot now (a gunicorn worker calls this on exit)"""
+        self._maybe_flush(force=True)
+
+    def _maybe_flush(self, force=False):
+        if not self.app.config['METRICS_DIR']:
+            return
+        now = time.monotonic()
+        if not force and now - self._flushed_at < self.app.config['METRICS_FLUSH_INTERVAL']:
+            return
+        self._flushed_at = now
+        data = self._registry().snapshot()
+        data['gauges'] = self._gauges()
+        path = self._path(self._pid)
+        if self._claimed:
+            _write_json(path, data)
+            return
+        # First write from this process: a file already under its pid was
+        # left by an exited process the OS gave the same pid
+        with self._folding():
+            if os.path.exists(path):
+                self._fold_exited([path])
+            _write_json(path, data)
+        self._claimed = True
+
+    @contextmanager
+    def _folding(self):
+        """Serialize folds, and first writes, across the processes sharing METRICS_DIR"""
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.app.config['METRICS_DIR'], '.fold.lock'), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _fold_exited(self, paths):
+        """Add exited processes' snapshots into EXITED_FILE, then delete them; call under _folding"""
+        exited_path = os.path.join(self.app.config['METRICS_DIR'], EXITED_FILE)
+        exited = _read_json(exited_path) or {'counters': [], 'histograms': [], 'buckets': {}, 'folded': []}
+        folded = exited['folded']
+        snapshots = [exited]
+        for path in paths:
+            data = _read_json(path)
+            if data is None or data.get('token') == self.registry.token:
+                continue
+            if data.get('token') not in folded:
+                snapshots.append(data)
+                folded.append(data.get('token'))
+        if len(snapshots) > 1:
+            counters, histograms, buckets = _sum_snapshots(snapshots)
+            _write_json(exited_path, {
+                'counters': [[name, [list(label) for label in labels], value]
+                             for (name, labels), value in counters.items()],
+                'histograms': [[name, [list(label) for label in labels], series]
+                               for (name, labels), series in histograms.items()],
+                'buckets': buckets,
+                'folded': folded[-FOLDED_TOKENS_KEPT:],
+            })
+        for path in paths:
+            data = _read_json(path)
+            if data is not None and data.get('token') == self.registry.token:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _collect(self):
+        """Snapshots of every worker: from METRICS_DIR if set, else just this process"""
+        metrics_dir = self.app.config['METRICS_DIR']
+        if not metrics_dir:
+            data = self._registry().snapshot()
+            data['gauges'] = self._gauges()
+            return [(os.getpid(), data)]
+
+        self._maybe_flush(force=True)
+        files = {}
+        for path in glob.glob(os.path.join(metrics_dir, 'metrics_*.json')):
+            try:
+                files[int(os.path.basename(path)[len('metrics_'):-len('.json')])] = path
+            except ValueError:
+                continue
+        snapshots = []
+        # Under the lock so no file is read both before and after being folded
+        with self._folding():
+            gone = [pid for pid in files if pid != os.getpid() and not _pid_alive(pid)]
+            if gone:
+                self._fold_exited([files.pop(pid) for pid in gone])
+            for pid, path in files.items():
+                data = _read_json(path)
+                if data is not None:
+                    snapshots.append((pid, data))
+            exited = _read_json(os.path.join(metrics_dir, EXITED_FILE))
+        if exited is not None:
+            snapshots.append((None, exited))
+        return snapshots
+
+    def render(self):
+        """Aggregate all workers into Prometheus text exposition format"""
+        snapshots = self._collect()
+        counters, histograms, buckets = _sum_snapshots(data for _, data in snapshots)
+        gauges = {}
+        for pid, data in snapshots:
+            if pid is not None and (pid == os.getpid() or _pid_alive(pid)):
+                for name, value in data.get('gauges', {}).items():
+                    gauges[name] = gauges.get(name, 0) + value
+
+        lines = []
+        for name, (kind, help_text) in HELP.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            if kind == 'gauge':
+                if name in gauges:
+                    lines.append(f'{name} {gauges[name]}')
+                continue
+            if kind == 'counter':
+                for (series_name, labels), value in sorted(counters.items()):
+                    if series_name == name:
+                        lines.append(f'{name}{_format_labels(labels)} {value}')
+                continue
+            for (series_name, labels), series in sorted(histograms.items()):
+                if series_name != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(list(buckets[name]) + ['+Inf'], series[:-1]):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_format_labels(labels + (("le", str(bound)),))} {cumulative}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {series[-1]}')
+                lines.append(f'{name}_count{_format_labels(labels)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+metrics = Metrics()
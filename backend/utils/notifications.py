@@ -0,0 +1,132 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from utils.email_service import send_todo_notification, send_todo_digest
+
+logger = logging.getLogger(__name__)
+
+# Per-user choice for todo-creation emails (users.notification_mode; NULL = NOTIFICATION_DEFAULT_MODE)
+NOTIFICATION_MODES = ('immediate', 'digest', 'none')
+
+class NotificationCoalescer:
+    """Todo-creation emails, sent from a background thread
+
+    The request only records the event: in 'digest' mode it joins the
+    user's buffer, which is mailed as one summary once it is
+    NOTIFICATION_WINDOW_SECONDS old; in 'immediate' mode it is mailed on
+    its own as soon as the thread wakes. Buffers live in the worker
+    process, so shutdown() must run before it exits (see gunicorn.conf.py).
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        # user_id -> digest, in order of each buffer's first event; every
+        # buffer has the same window, so the due ones are always at the front
+        self._digests = {}
+        self._immediate = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread = None
+        self._pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['notifications'] = self
+
+    def mode_for(self, user):
+        return user.notification_mode or self.app.config['NOTIFICATION_DEFAULT_MODE']
+
+    def _ensure_started(self):
+        # Started lazily, and again in each forked gunicorn worker
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._digests, self._immediate, self._stopping = {}, deque(), False
+            self._thread = threading.Thread(target=self._run, name='notification-coalescer', daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def todo_created(self, user, title, description=None):
+        """Record that user created a todo; user is an AuthenticatedUser"""
+        mode = self.mode_for(user)
+        if mode == 'none':
+            return
+        self._ensure_started()
+        if mode == 'immediate':
+            self._immediate.append((user.email, user.first_name, title, description))
+            self._wakeup.set()
+            return
+
+        with self._lock:
+            digest = self._digests.get(user.id)
+            if digest is None:
+                digest = self._digests[user.id] = {
+                    'started': time.monotonic(), 'email': user.email, 'name': user.first_name,
+                    'todos': [], 'more': 0
+                }
+            if len(digest['todos']) < self.app.config['NOTIFICATION_DIGEST_MAX_ITEMS']:
+                digest['todos'].append((title, description))
+            else:
+                digest['more'] += 1
+
+    def pending(self):
+        """Number of buffered digests and immediate emails in this process"""
+        if self._pid != os.getpid():
+            return 0
+        return len(self._digests) + len(self._immediate)
+
+    def shutdown(self, timeout=None):
+        """Send every buffered notification now, then stop the thread"""
+        if self._pid != os.getpid():
+            return
+        self._stopping = True
+        self._wakeup.set()
+        self._thread.join(timeout)
+        self._pid = None
+
+    def _run(self):
+        window = self.app.config['NOTIFICATION_WINDOW_SECONDS']
+        while True:
+            self._wakeup.wait(min(window, 1.0))
+            self._wakeup.clear()
+            stopping = self._stopping
+            with self.app.app_context():
+                self._flush(None if stopping else time.monotonic() - window)
+            if stopping:
+                return
+
+    def _flush(self, started_before):
+        """Send immediate emails, and digests started before the given time (None: all)"""
+        with self._lock:
+            due = []
+            for user_id, digest in self._digests.items():
+                if started_before is not None and digest['started'] > started_before:
+                    break
+                due.append(user_id)
+            digests = [self._digests.pop(user_id) for user_id in due]
+
+        while self._immediate:
+            email, name, title, description = self._immediate.popleft()
+            self._send(send_todo_notification, email, name, title, description)
+
+        for digest in digests:
+            if len(digest['todos']) == 1:
+                title, description = digest['todos'][0]
+                self._send(send_todo_notification, digest['email'], digest['name'], title, description)
+            else:
+                self._send(send_todo_digest, digest['email'], digest['name'], digest['todos'], digest['more'])
+
+    def _send(self, send, *args):
+        try:
+            send(*args)
+        except Exception:
+            logger.exception('Failed to send todo notification')
+
+notifier = NotificationCoalescer()
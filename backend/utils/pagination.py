@@ -0,0 +1,80 @@
+import base64
+import json
+from datetime import datetime
+from math import ceil
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+
+def _encode(values):
+    payload = json.dumps(values, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def _decode(cursor):
+    padded = cursor + '=' * (-len(cursor) % 4)
+    return json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+
+
+def encode_cursor(created_at, todo_id):
+    """Encode a (created_at, id) position as an opaque cursor string"""
+    return _encode([created_at.isoformat(), todo_id])
+
+
+def decode_cursor(cursor):
+    """Decode a cursor produced by encode_cursor back into (created_at, id)"""
+    try:
+        created_at, todo_id = _decode(cursor)
+        return datetime.fromisoformat(created_at), int(todo_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f'Invalid cursor: {cursor}') from e
+
+
+def encode_sync_cursor(change_seq, todo_id, horizon=0):
+    """Encode a (change_seq, id) position in a user's change stream
+
+    horizon is the user's sync horizon when the client's sync started from
+    scratch: tombstones purged before then never concerned it.
+    """
+    return _encode([change_seq, todo_id, horizon] if horizon else [change_seq, todo_id])
+
+
+def decode_sync_cursor(cursor):
+    """Decode a cursor produced by encode_sync_cursor back into (change_seq, id, horizon)"""
+    try:
+        change_seq, todo_id, *horizon = _decode(cursor)
+        if len(horizon) > 1:
+            raise ValueError('too many values')
+        return int(change_seq), int(todo_id), int(horizon[0]) if horizon else 0
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f'Invalid cursor: {cursor}') from e
+
+
+def paginate_rows(session, statement, count_statement, page, per_page):
+    """Run one offset page of a select, returning (rows, pagination dict)
+
+    Matches Flask-SQLAlchemy's paginate(error_out=False) figures, but works
+    on plain column selects and skips the COUNT when the page itself shows
+    where the results end.
+    """
+    page = page if page >= 1 else 1
+    per_page = per_page if per_page >= 1 else 20
+    offset = (page - 1) * per_page
+
+    rows = session.execute(statement.limit(per_page).offset(offset)).all()
+    if rows and len(rows) < per_page:
+        total = offset + len(rows)
+    elif not rows and page == 1:
+        total = 0
+    else:
+        total = session.scalar(count_statement)
+
+    pages = ceil(total / per_page) if total else 0
+    return rows, {
+        'total': total,
+        'pages': pages,
+        'has_next': page < pages,
+        'has_prev': page > 1
+    }
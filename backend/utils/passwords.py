@@ -0,0 +1,99 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, has_app_context
+import bcrypt
+
+# bcrypt's own default cost
+DEFAULT_ROUNDS = 12
+
+class PasswordHasherBusy(Exception):
+    """Raised when too many password hash/verify calls are already in flight"""
+
+_lock = threading.Lock()
+_pool = None  # (pid, executor, in-flight semaphore)
+
+def _setting(name, default):
+    if has_app_context():
+        return current_app.config.get(name, default)
+    return default
+
+def _get_pool():
+    # Recreated after fork so every gunicorn worker gets its own threads
+    global _pool
+    pool = _pool
+    if pool is None or pool[0] != os.getpid():
+        with _lock:
+            pool = _pool
+            if pool is None or pool[0] != os.getpid():
+                workers = _setting('BCRYPT_MAX_WORKERS', None) or os.cpu_count() or 1
+                in_flight = _setting('BCRYPT_MAX_IN_FLIGHT', None) or workers * 4
+                pool = (
+                    os.getpid(),
+                    ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt'),
+                    threading.BoundedSemaphore(in_flight)
+                )
+                _pool = pool
+    return pool[1], pool[2]
+
+def _run(fn, *args):
+    """Run a bcrypt call in the calling thread, shedding load when too many are in flight
+
+    Handing it to the executor would not free a WSGI request thread, which
+    would only wait for the result; the in-flight limit is what bounds the
+    CPU spent on hashing. bcrypt releases the GIL, so other threads run.
+    """
+    _, slots = _get_pool()
+    if not slots.acquire(timeout=_setting('BCRYPT_QUEUE_TIMEOUT', 2)):
+        raise PasswordHasherBusy('Too many password operations in progress')
+    try:
+        return fn(*args)
+    finally:
+        slots.release()
+
+async def _run_async(fn, *args):
+    """_run for coroutines: the call runs on the executor so the event loop keeps serving"""
+    executor, slots = _get_pool()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + _setting('BCRYPT_QUEUE_TIMEOUT', 2)
+    while not slots.acquire(blocking=False):
+        if loop.time() >= deadline:
+            raise PasswordHasherBusy('Too many password operations in progress')
+        await asyncio.sleep(0.01)
+    try:
+        return await asyncio.wrap_future(executor.submit(fn, *args))
+    finally:
+        slots.release()
+
+def configured_rounds():
+    return _setting('BCRYPT_ROUNDS', DEFAULT_ROUNDS)
+
+def hash_password(password):
+    """Hash a password at the configured bcrypt cost"""
+    salt = bcrypt.gensalt(rounds=configured_rounds())
+    return _run(bcrypt.hashpw, password.encode('utf-8'), salt).decode('utf-8')
+
+def verify_password(password, password_hash):
+    """Check a password against a stored bcrypt hash"""
+    return _run(bcrypt.checkpw, password.encode('utf-8'), password_hash.encode('utf-8'))
+
+async def hash_password_async(password):
+    """hash_password for async callers"""
+    salt = bcrypt.gensalt(rounds=configured_rounds())
+    return (await _run_async(bcrypt.hashpw, password.encode('utf-8'), salt)).decode('utf-8')
+
+async def verify_password_async(password, password_hash):
+    """verify_password for async callers"""
+    return await _run_async(bcrypt.checkpw, password.encode('utf-8'), password_hash.encode('utf-8'))
+
+def hash_rounds(password_hash):
+    """Cost factor stored in a bcrypt hash ($2b$<rounds>$...), or None if unparseable"""
+    try:
+        return int(password_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+def needs_rehash(password_hash):
+    """True when a hash was made with a different cost than currently configured"""
+    return hash_rounds(password_hash) != configured_rounds()
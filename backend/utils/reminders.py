@@ -0,0 +1,139 @@
+import logging
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import bindparam, or_, select, tuple_, update
+from models.models import Todo, User, ReminderState, db
+from utils.email_service import send_reminder_digest
+
+logger = logging.getLogger(__name__)
+
+PASSES = ('overdue', 'due_soon')
+
+def reminder_scan_statement(after, until, limit, unreminded=False):
+    """Pending todos with after < (due_date, id) and due_date <= until, in index order
+
+    A range scan on ix_todos_completed_due: completed is matched by equality
+    and (due_date, id) bounds the range, so the cost follows the rows in
+    the range, not the table size. With unreminded, todos whose due-soon
+    reminder was already sent for their current due date are skipped.
+    """
+    query = (
+        select(Todo.id, Todo.user_id, Todo.title, Todo.due_date)
+        .where(
+            Todo.completed == False,
+            tuple_(Todo.due_date, Todo.id) > after,
+            Todo.due_date <= until
+        )
+        .order_by(Todo.due_date, Todo.id)
+        .limit(limit)
+    )
+    if unreminded:
+        query = query.where(or_(Todo.reminded_due_date.is_(None), Todo.reminded_due_date != Todo.due_date))
+    return query
+
+def _stamp_reminded(rows):
+    """Record the due date each todo's due-soon reminder was sent for"""
+    if not rows:
+        return
+    todos = Todo.__table__
+    # Core UPDATE with updated_at kept: a reminder is not an edit of the todo
+    db.session.execute(
+        update(todos)
+        .where(todos.c.id == bindparam('todo_id'))
+        .values(reminded_due_date=bindparam('due'), updated_at=todos.c.updated_at),
+        [{'todo_id': row.id, 'due': row.due_date} for row in rows]
+    )
+
+def _load_state(name, now):
+    state = db.session.get(ReminderState, name)
+    if state is None:
+        # A first run announces nothing that was already due
+        state = ReminderState(name=name, due_date=now, todo_id=0)
+        db.session.add(state)
+    return state
+
+def _send_digests(digests):
+    """Send one reminder email per active user; returns the number queued"""
+    config = current_app.config
+    max_items = config['REMINDER_DIGEST_MAX_ITEMS']
+    user_ids = list(digests)
+    sent = 0
+    for start in range(0, len(user_ids), 500):
+        users = db.session.execute(
+            select(User.id, User.email, User.first_name)
+            .where(User.id.in_(user_ids[start:start + 500]), User.is_active == True)
+        ).all()
+        for user in users:
+            todos = digests[user.id]
+            overdue = todos['overdue'][:max_items]
+            due_soon = todos['due_soon'][:max_items - len(overdue)]
+            more = len(todos['overdue']) + len(todos['due_soon']) - len(overdue) - len(due_soon)
+            if send_reminder_digest(user.email, user.first_name, due_soon, overdue, more,
+                                    wait=config['REMINDER_ENQUEUE_TIMEOUT']):
+                sent += 1
+            else:
+                logger.warning('Reminder digest for user %s was dropped', user.id)
+    return sent
+
+def run_reminders(now=None):
+    """One scheduler run: mail every user whose todos fell due since the
+    previous run or are due within REMINDER_DUE_SOON_HOURS and not yet announced
+
+    The overdue pass resumes from its high-water mark in reminder_state, so
+    it only reads the todos that fell due since the last run. The due-soon
+    pass reads its whole window every run, so todos created or rescheduled
+    at short notice are found too, and skips those whose reminder was sent
+    for their current due date (Todo.reminded_due_date). The mark and the
+    stamps are committed after the digests are queued: a crash in between
+    repeats those reminders rather than losing them. Returns a summary dict.
+    """
+    config = current_app.config
+    now = now or datetime.utcnow()
+    until = {
+        'overdue': now,
+        'due_soon': now + timedelta(hours=config['REMINDER_DUE_SOON_HOURS']),
+    }
+    batch_size = config['REMINDER_BATCH_SIZE']
+    budget = config['REMINDER_MAX_PER_RUN']
+
+    # user_id -> pass name -> [(title, due_date)]
+    digests = {}
+    counts = dict.fromkeys(PASSES, 0)
+    reminded = []
+    try:
+        for name in PASSES:
+            if name == 'overdue':
+                state = _load_state(name, now)
+                after = (state.due_date, state.todo_id)
+            else:
+                # Todos already past due belong to the overdue pass
+                after = (now, 0)
+
+            while budget > 0:
+                limit = min(batch_size, budget)
+                rows = db.session.execute(
+                    reminder_scan_statement(after, until[name], limit, unreminded=name == 'due_soon')
+                ).all()
+                for row in rows:
+                    digest = digests.setdefault(row.user_id, {p: [] for p in PASSES})
+                    digest[name].append((row.title, row.due_date))
+                if name == 'due_soon':
+                    reminded.extend(rows)
+                counts[name] += len(rows)
+                budget -= len(rows)
+                if rows:
+                    after = (rows[-1].due_date, rows[-1].id)
+                if len(rows) < limit:
+                    break
+
+            if name == 'overdue':
+                state.due_date, state.todo_id = after
+
+        sent = _send_digests(digests)
+        _stamp_reminded(reminded)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return {**counts, 'users': len(digests), 'emails': sent, 'capped': budget <= 0}
@@ -0,0 +1,161 @@
+import logging
+import os
+import random
+import threading
+from flask import current_app, g, has_request_context, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from flask_sqlalchemy.session import Session as FlaskSession
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from utils.admission import create_store
+
+logger = logging.getLogger(__name__)
+
+# SQLALCHEMY_BINDS keys of the read replicas (config.REPLICA_DATABASE_URLS)
+REPLICA_BIND_PREFIX = 'replica'
+READ_METHODS = ('GET', 'HEAD')
+
+def _request_identity():
+    """JWT identity of the current request, or None without a valid token"""
+    try:
+        verify_jwt_in_request(optional=True)
+        identity = get_jwt_identity()
+    except Exception:
+        return None
+    return str(identity) if identity is not None else None
+
+def _is_read(clause):
+    return getattr(clause, 'is_select', False) and getattr(clause, '_for_update_arg', None) is None
+
+class ReplicaRouter:
+    """Chooses the database each request reads from
+
+    A GET or HEAD request is served by one replica, picked at random, unless
+    its user is pinned; any other request, and all work outside a request,
+    uses the primary. A request that writes switches its own remaining reads
+    to the primary, and on commit pins its user, and the users whose rows
+    it changed, to the primary for REPLICA_PIN_SECONDS, so they read their
+    own writes while the replicas catch up.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.keys = ()
+        self._store = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.keys = tuple(sorted(
+            key for key in app.config.get('SQLALCHEMY_BINDS') or {} if key.startswith(REPLICA_BIND_PREFIX)
+        ))
+        app.extensions['replicas'] = self
+        if self.keys and app.config['REPLICA_PIN_STORE'] == 'memory' and app.config['WEB_CONCURRENCY'] > 1:
+            logger.warning('REPLICA_PIN_STORE=memory with %s workers: a write pins its user in one worker '
+                           'only, so other workers may serve that user stale replica reads',
+                           app.config['WEB_CONCURRENCY'])
+
+    @property
+    def store(self):
+        # Created per process, like the admission store
+        store = self._store
+        if store is None or store[0] != os.getpid():
+            with self._lock:
+                store = self._store
+                if store is None or store[0] != os.getpid():
+                    store = self._store = (os.getpid(), create_store(self.app.config['REPLICA_PIN_STORE']))
+        return store[1]
+
+    def read_replica(self):
+        """Bind key of the replica serving this request's reads, or None for the primary"""
+        if not self.keys or not has_request_context():
+            return None
+        if '_read_replica' not in g:
+            g._read_replica = self._choose()
+        return g._read_replica
+
+    def _choose(self):
+        if request.method not in READ_METHODS:
+            return None
+        identity = _request_identity()
+        try:
+            if identity is not None and self.store.marked(f'pin:user:{identity}'):
+                return None
+        except Exception:
+            logger.exception('Replica pin lookup failed; reading from the primary')
+            return None
+        return random.choice(self.keys)
+
+    def pin(self, user_ids):
+        """Send the given users' reads to the primary for REPLICA_PIN_SECONDS"""
+        ttl = self.app.config['REPLICA_PIN_SECONDS']
+        for user_id in user_ids:
+            self.store.mark(f'pin:user:{user_id}', ttl)
+
+    def _wrote(self, session, user_ids=()):
+        # Called for every ORM write in the request's sessions
+        g._read_replica = None
+        pins = session.info.setdefault('replica_pins', set())
+        identity = _request_identity()
+        if identity is not None:
+            pins.add(identity)
+        pins.update(str(user_id) for user_id in user_ids if user_id is not None)
+
+def _router():
+    """The app's ReplicaRouter, when replicas are configured and a request is active"""
+    if not has_request_context():
+        return None
+    router = current_app.extensions.get('replicas')
+    return router if router is not None and router.keys else None
+
+class RoutingSession(FlaskSession):
+    """db.session: SELECTs go to the replica ReplicaRouter picks for the request"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and _is_read(clause):
+            router = _router()
+            key = router.read_replica() if router is not None else None
+            if key is not None:
+                return self._db.engines[key]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+# Registered on Session itself so AsyncSession writes (asgi.py) pin users too
+
+@event.listens_for(Session, 'after_flush')
+def _record_flushed_writers(session, flush_context):
+    router = _router()
+    if router is None:
+        return
+    user_ids = []
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        user_id = getattr(obj, 'user_id', None)
+        if user_id is None and getattr(type(obj), '__tablename__', None) == 'users':
+            user_id = obj.id
+        user_ids.append(user_id)
+    router._wrote(session, user_ids)
+
+@event.listens_for(Session, 'do_orm_execute')
+def _record_statement_writers(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        router = _router()
+        if router is not None:
+            router._wrote(orm_execute_state.session)
+
+@event.listens_for(Session, 'after_commit')
+def _pin_writers(session):
+    user_ids = session.info.pop('replica_pins', None)
+    router = _router()
+    if not user_ids or router is None:
+        return
+    try:
+        router.pin(user_ids)
+    except Exception:
+        logger.exception('Failed to pin users to the primary')
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_writers(session):
+    session.info.pop('replica_pins', None)
+
+replica_router = ReplicaRouter()
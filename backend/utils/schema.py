@@ -0,0 +1,53 @@
+from sqlalchemy import inspect, text
+from models.models import db
+from utils.search import install_search
+
+def init_schema(app):
+    """Create or upgrade the schema: tables, added columns, indexes and the full-text index
+
+    Every step is idempotent. This is the deploy-time step (python setup_db.py);
+    create_app() no longer runs it, so workers start without reflecting the
+    schema. Returns the columns added to existing tables.
+    """
+    with app.app_context():
+        db.create_all()
+        added = upgrade_schema()
+    install_search(app)
+    return added
+
+def upgrade_schema():
+    """Add columns declared on the models but missing from existing tables
+
+    create_all() only creates missing tables, so databases created before a
+    column was introduced need it added in place. New columns must therefore
+    be nullable or carry a server_default.
+    """
+    engine = db.engine
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+
+    with engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_columns = {c['name'] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                ddl = f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(engine.dialect)}'
+                if column.server_default is not None:
+                    default = column.server_default.arg
+                    ddl += f" DEFAULT '{default}'" if isinstance(default, str) else f' DEFAULT {default.text}'
+                if not column.nullable:
+                    ddl += ' NOT NULL'
+                conn.execute(text(ddl))
+                added.append(f'{table.name}.{column.name}')
+
+        # Indexes on pre-existing tables (create_all skips tables that exist)
+        for table in db.metadata.sorted_tables:
+            if table.name in existing_tables:
+                for index in table.indexes:
+                    index.create(conn, checkfirst=True)
+
+    return added
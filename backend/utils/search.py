@@ -0,0 +1,148 @@
+import logging
+import re
+from flask import current_app
+from sqlalchemy import text, func, select, literal_column, table, column
+from models.models import Todo, db
+
+logger = logging.getLogger(__name__)
+
+# SQLite: external-content FTS5 index over todos, kept in sync by triggers
+SQLITE_SEARCH_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS todos_fts USING fts5(
+        title, description, content='todos', content_rowid='id'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS todos_fts_ai AFTER INSERT ON todos BEGIN
+        INSERT INTO todos_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS todos_fts_ad AFTER DELETE ON todos BEGIN
+        INSERT INTO todos_fts(todos_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS todos_fts_au AFTER UPDATE OF title, description ON todos BEGIN
+        INSERT INTO todos_fts(todos_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO todos_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+]
+
+# PostgreSQL: generated tsvector column (title weighted above description) with a GIN index
+POSTGRES_SEARCH_DDL = [
+    """
+    ALTER TABLE todos ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(description, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_todos_search_vector ON todos USING GIN (search_vector)",
+]
+
+todos_fts = table('todos_fts', column('rowid'), column('rank'))
+search_vector = literal_column('todos.search_vector')
+
+def install_search(app):
+    """Create the full-text index for the current database and record which backend is active"""
+    with app.app_context():
+        dialect = db.engine.dialect.name
+        backend = 'like'
+        try:
+            with db.engine.begin() as conn:
+                if dialect == 'sqlite':
+                    exists = conn.execute(text(
+                        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'todos_fts'"
+                    )).first()
+                    for statement in SQLITE_SEARCH_DDL:
+                        conn.execute(text(statement))
+                    if not exists:
+                        # Index rows that were written before the triggers existed
+                        conn.execute(text("INSERT INTO todos_fts(todos_fts) VALUES ('rebuild')"))
+                    backend = 'fts5'
+                elif dialect == 'postgresql':
+                    for statement in POSTGRES_SEARCH_DDL:
+                        conn.execute(text(statement))
+                    backend = 'tsvector'
+        except Exception as e:
+            logger.warning('Full-text search unavailable, falling back to LIKE: %s', e)
+            backend = 'like'
+        app.extensions['todo_search'] = backend
+    return backend
+
+def detect_search(engine):
+    """Backend whose index install_search() left in the database, without creating anything"""
+    checks = {
+        'sqlite': ('fts5', "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'todos_fts'"),
+        'postgresql': ('tsvector', "SELECT 1 FROM information_schema.columns "
+                                   "WHERE table_name = 'todos' AND column_name = 'search_vector'"),
+    }
+    if engine.dialect.name not in checks:
+        return 'like'
+    backend, query = checks[engine.dialect.name]
+    try:
+        with engine.connect() as conn:
+            if conn.execute(text(query)).first():
+                return backend
+    except Exception as e:
+        logger.warning('Could not detect full-text search, using LIKE: %s', e)
+    return 'like'
+
+def init_app(app):
+    """Record the backend already installed in the database
+
+    Detected once here so a search request never has to query for it: the
+    async routes reach apply_todo_search on the event loop.
+    """
+    with app.app_context():
+        app.extensions['todo_search'] = detect_search(db.engine)
+
+def search_backend():
+    """Active backend: detected by init_app(), updated by install_search()"""
+    return current_app.extensions['todo_search']
+
+def _search_terms(term):
+    """Split user input into word tokens safe to embed in a match expression"""
+    return re.findall(r'\w+', term.lower())
+
+def apply_todo_search(query, term, ranked=False):
+    """Filter a Todo query (or select) by search term, optionally ordering by relevance
+
+    Every token must match, and the last token may be a prefix of a word so
+    results update sensibly while the user is still typing.
+    """
+    backend = search_backend()
+    terms = _search_terms(term)
+
+    if backend == 'fts5' and terms:
+        match = ' '.join(f'"{t}"' for t in terms[:-1])
+        match = f'{match} "{terms[-1]}"*'.strip()
+        # The MATCH has to run once, up front: joined directly, SQLite may walk
+        # the user's todos and re-evaluate it per row (seconds on large lists)
+        matches = select(todos_fts.c.rowid, todos_fts.c.rank).where(
+            text('todos_fts MATCH :fts_match').bindparams(fts_match=match)
+        )
+        if not ranked:
+            return query.filter(Todo.id.in_(matches.with_only_columns(todos_fts.c.rowid)))
+        matches = matches.cte('fts_matches').prefix_with('MATERIALIZED')
+        # FTS5 rank is bm25(): smaller is more relevant
+        return query.join(matches, matches.c.rowid == Todo.id).order_by(matches.c.rank)
+
+    if backend == 'tsvector' and terms:
+        tsquery = func.to_tsquery('simple', ' & '.join(terms[:-1] + [f'{terms[-1]}:*']))
+        query = query.filter(search_vector.op('@@')(tsquery))
+        if ranked:
+            query = query.order_by(func.ts_rank(search_vector, tsquery).desc())
+        return query
+
+    return query.filter(
+        Todo.title.ilike(f'%{term}%') |
+        Todo.description.ilike(f'%{term}%')
+    )
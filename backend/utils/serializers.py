@@ -0,0 +1,31 @@
+from models.models import Todo
+
+# Columns selected instead of full Todo objects on bulk read paths
+TODO_COLUMNS = (
+    Todo.id, Todo.title, Todo.description, Todo.completed, Todo.priority, Todo.due_date,
+    Todo.created_at, Todo.updated_at, Todo.completed_at, Todo.user_id
+)
+TODO_FIELDS = tuple(column.key for column in TODO_COLUMNS)
+
+def todo_row_to_dict(row):
+    """Same shape as Todo.to_dict(), built from a TODO_COLUMNS row tuple"""
+    todo_id, title, description, completed, priority, due_date, created_at, updated_at, completed_at, user_id = row
+    return {
+        'id': todo_id,
+        'title': title,
+        'description': description,
+        'completed': completed,
+        'priority': priority,
+        'due_date': due_date.isoformat() if due_date else None,
+        'created_at': created_at.isoformat(),
+        'updated_at': updated_at.isoformat(),
+        'completed_at': completed_at.isoformat() if completed_at else None,
+        'user_id': user_id
+    }
+
+def todo_row_to_csv(row):
+    """CSV cells for a TODO_COLUMNS row tuple, in TODO_FIELDS order"""
+    return [
+        '' if value is None else value.isoformat() if hasattr(value, 'isoformat') else value
+        for value in row
+    ]
@@ -0,0 +1,77 @@
+from flask import current_app
+from sqlalchemy import select, func, case
+from models.models import Todo, db
+from utils.cache import TTLCache
+from utils.versioning import get_todos_version
+from datetime import datetime
+
+def init_app(app):
+    """Attach the per-user stats cache to the app"""
+    app.extensions['todo_stats_cache'] = TTLCache(
+        maxsize=app.config['STATS_CACHE_SIZE'],
+        ttl=app.config['STATS_CACHE_TTL']
+    )
+
+def todo_stats_statement(user_id, now):
+    """Single conditional-aggregation query computing every stats figure"""
+    pending = Todo.completed == False
+
+    def count_where(condition):
+        return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+    return select(
+        func.count(Todo.id),
+        count_where(Todo.completed == True),
+        count_where(pending & (Todo.priority == 'high')),
+        count_where(pending & (Todo.priority == 'medium')),
+        count_where(pending & (Todo.priority == 'low')),
+        count_where(pending & (Todo.due_date < now)),
+        # Earliest pending due date still in the future: the cached figures
+        # stop being valid once it passes and that todo becomes overdue
+        func.min(case((pending & (Todo.due_date >= now), Todo.due_date)))
+    ).where(Todo.user_id == user_id)
+
+def build_stats(row):
+    """Shape an aggregate row from todo_stats_statement into the API payload"""
+    total_todos, completed_todos, high, medium, low, overdue_todos = row[:6]
+    return {
+        'total_todos': total_todos,
+        'completed_todos': completed_todos,
+        'pending_todos': total_todos - completed_todos,
+        'completion_rate': round((completed_todos / total_todos * 100) if total_todos > 0 else 0, 2),
+        'priority_breakdown': {
+            'high': high,
+            'medium': medium,
+            'low': low
+        },
+        'overdue_todos': overdue_todos
+    }
+
+def load_todo_stats(user_id, session=None):
+    """Return todo statistics for a user, served from cache when possible
+
+    Each worker has its own cache and invalidate_todo_stats only reaches the
+    worker that made the write, so entries carry users.todos_version: a
+    primary-key read of the current version tells whether they still hold.
+    """
+    session = session or db.session
+    cache = current_app.extensions['todo_stats_cache']
+    version, _ = get_todos_version(user_id, session)
+    entry = cache.get(user_id)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+
+    now = datetime.utcnow()
+    row = session.execute(todo_stats_statement(user_id, now)).one()
+    stats = build_stats(row)
+
+    ttl = cache.ttl
+    next_due = row[6]
+    if next_due is not None:
+        ttl = min(ttl, (next_due - now).total_seconds())
+    cache.set(user_id, (version, stats), ttl=ttl)
+    return stats
+
+def invalidate_todo_stats(user_id):
+    """Drop cached stats after the user's todos changed"""
+    current_app.extensions['todo_stats_cache'].pop(user_id)
@@ -0,0 +1,105 @@
+from sqlalchemy import tuple_, select, func
+from models.models import Todo, TodoTombstone, User
+from utils.search import apply_todo_search
+from utils.serializers import TODO_COLUMNS, todo_row_to_dict
+from utils.pagination import encode_cursor, decode_cursor, encode_sync_cursor
+
+# Statement builders and payload shapers shared by the WSGI and ASGI todo
+# routes; callers execute the statements on their own (sync or async) session
+
+def todo_list_statements(user_id, completed=None, priority=None, search='', ranked=True):
+    """(rows, count) selects for a user's todo list; rows are TODO_COLUMNS tuples, not ORM objects"""
+    conditions = [Todo.user_id == user_id]
+
+    # Apply filters
+    if completed is not None:
+        completed_bool = completed.lower() in ['true', '1', 'yes']
+        conditions.append(Todo.completed == completed_bool)
+
+    if priority and priority in ['low', 'medium', 'high']:
+        conditions.append(Todo.priority == priority)
+
+    query = select(*TODO_COLUMNS).where(*conditions)
+    # The count never needs the relevance ranking
+    count_query = select(func.count(Todo.id)).where(*conditions)
+    if search:
+        query = apply_todo_search(query, search, ranked=ranked)
+        count_query = apply_todo_search(count_query, search)
+    return query, count_query
+
+def cursor_page_statement(query, cursor, per_page):
+    """Keyset page of query after cursor (empty = first page); raises InvalidCursor"""
+    if cursor:
+        created_at, todo_id = decode_cursor(cursor)
+        query = query.filter(tuple_(Todo.created_at, Todo.id) < (created_at, todo_id))
+
+    # Fetch one extra row to learn whether another page exists
+    return query.order_by(Todo.created_at.desc(), Todo.id.desc()).limit(per_page + 1)
+
+def cursor_page(rows, per_page):
+    """Response payload for the rows cursor_page_statement returned"""
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+
+    next_cursor = None
+    if has_next:
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+
+    return {
+        'todos': [todo_row_to_dict(row) for row in rows],
+        'pagination': {
+            'per_page': per_page,
+            'next_cursor': next_cursor,
+            'has_next': has_next
+        }
+    }
+
+def todo_changes_statements(user_id, change_seq, todo_id, limit):
+    """(todos, tombstones) selects for changes after a (change_seq, id) sync position"""
+    # Two index range scans, merged in (change_seq, id) order by todo_changes
+    todos = select(Todo).where(
+        Todo.user_id == user_id,
+        tuple_(Todo.change_seq, Todo.id) > (change_seq, todo_id)
+    ).order_by(Todo.change_seq, Todo.id).limit(limit + 1)
+
+    tombstones = select(TodoTombstone).where(
+        TodoTombstone.user_id == user_id,
+        tuple_(TodoTombstone.change_seq, TodoTombstone.todo_id) > (change_seq, todo_id)
+    ).order_by(TodoTombstone.change_seq, TodoTombstone.todo_id).limit(limit + 1)
+    return todos, tombstones
+
+def sync_horizon_statement(user_id):
+    """Select of the user's todos_sync_horizon"""
+    return select(User.todos_sync_horizon).where(User.id == user_id)
+
+def sync_cursor_expired(change_seq, cursor_horizon, horizon):
+    """True when tombstones after a cursor may have been purged, so the client must resync"""
+    return horizon > max(change_seq, cursor_horizon)
+
+def todo_changes(todos, tombstones, position, cursor_horizon, limit):
+    """Response payload merging the results of todo_changes_statements"""
+    # A deletion sorts before an upsert of the same (change_seq, id)
+    entries = sorted(
+        [(t.change_seq, t.todo_id, 0, t) for t in tombstones] +
+        [(t.change_seq, t.id, 1, t) for t in todos],
+        key=lambda entry: entry[:3]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    changes = []
+    for _, _, is_upsert, record in entries:
+        if is_upsert:
+            changes.append({'type': 'upsert', 'todo': record.to_dict()})
+        else:
+            changes.append({'type': 'delete', **record.to_dict()})
+
+    if entries:
+        position = (entries[-1][0], entries[-1][1])
+    next_cursor = encode_sync_cursor(*position, cursor_horizon)
+
+    return {
+        'changes': changes,
+        'next_cursor': next_cursor,
+        'has_more': has_more
+    }
@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import select, update, delete, func
+from models.models import TodoTombstone, User, db
+
+def purge_tombstones(now=None):
+    """Delete tombstones older than TOMBSTONE_RETENTION_DAYS; returns the number deleted
+
+    Each affected user's todos_sync_horizon moves past their newest purged
+    tombstone in the same transaction, so /api/todos/changes turns away the
+    cursors that could still have needed one (410, resync_required) instead
+    of silently skipping the deletion. Whole change_seq values are purged at
+    once: a bulk delete's tombstones share one.
+    """
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(days=current_app.config['TOMBSTONE_RETENTION_DAYS'])
+    expired = db.session.execute(
+        select(TodoTombstone.user_id, func.max(TodoTombstone.change_seq))
+        .where(TodoTombstone.deleted_at < cutoff)
+        .group_by(TodoTombstone.user_id)
+    ).all()
+
+    purged = 0
+    for user_id, change_seq in expired:
+        # One short transaction per user: it holds the user's row lock
+        try:
+            db.session.execute(
+                update(User)
+                .where(User.id == user_id, User.todos_sync_horizon <= change_seq)
+                .values(todos_sync_horizon=change_seq + 1, updated_at=User.updated_at),
+                execution_options={'synchronize_session': False}
+            )
+            deleted = db.session.execute(
+                delete(TodoTombstone)
+                .where(TodoTombstone.user_id == user_id, TodoTombstone.change_seq <= change_seq),
+                execution_options={'synchronize_session': False}
+            ).rowcount
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        purged += deleted
+    return purged
@@ -0,0 +1,92 @@
+from datetime import datetime
+
+PRIORITIES = ['low', 'medium', 'high']
+
+def parse_due_date(value):
+    """Parse an ISO format due date (a trailing Z is accepted); raises ValueError"""
+    if not isinstance(value, str):
+        raise ValueError('due_date must be a string')
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+def is_todo_id(value):
+    """True for an integer id (JSON true/false are not ids)"""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def _optional_string(data, name):
+    """data[name] stripped, or None when missing, null or blank; raises TypeError for non-strings"""
+    value = data.get(name)
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        raise TypeError(f'{name} must be a string')
+    return value.strip() or None
+
+def validate_new_todo(data):
+    """Validate a todo creation payload, returning (fields, error)"""
+    try:
+        title = _optional_string(data, 'title')
+        description = _optional_string(data, 'description')
+    except TypeError as e:
+        return None, str(e)
+    if not title:
+        return None, 'Title is required'
+
+    priority = data.get('priority', 'medium')
+
+    # Validate priority
+    if priority not in PRIORITIES:
+        priority = 'medium'
+
+    # Parse due date
+    due_date = None
+    if data.get('due_date'):
+        try:
+            due_date = parse_due_date(data['due_date'])
+        except (TypeError, ValueError):
+            return None, 'Invalid due_date format. Use ISO format.'
+
+    return {
+        'title': title,
+        'description': description,
+        'priority': priority,
+        'due_date': due_date
+    }, None
+
+def validate_todo_changes(data):
+    """Validate a todo update payload, returning (changes, error)
+
+    Only fields present in data are returned. An invalid priority is ignored,
+    and 'completed' (which must be a JSON boolean) is passed through for the
+    caller to apply.
+    """
+    changes = {}
+
+    try:
+        if 'title' in data:
+            title = _optional_string(data, 'title')
+            if not title:
+                return None, 'Title cannot be empty'
+            changes['title'] = title
+
+        if 'description' in data:
+            changes['description'] = _optional_string(data, 'description')
+    except TypeError as e:
+        return None, str(e)
+
+    if 'priority' in data and data['priority'] in PRIORITIES:
+        changes['priority'] = data['priority']
+
+    if 'due_date' in data:
+        changes['due_date'] = None
+        if data['due_date']:
+            try:
+                changes['due_date'] = parse_due_date(data['due_date'])
+            except (TypeError, ValueError):
+                return None, 'Invalid due_date format. Use ISO format.'
+
+    if 'completed' in data:
+        if not isinstance(data['completed'], bool):
+            return None, 'completed must be true or false'
+        changes['completed'] = data['completed']
+
+    return changes, None
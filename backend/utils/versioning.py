@@ -0,0 +1,30 @@
+from sqlalchemy import select, update
+from models.models import User, db
+from datetime import datetime
+
+def bump_todos_version(user_id, session=None):
+    """Increment the user's todo collection version inside the current transaction
+
+    Call before committing any write to the user's todos. The UPDATE also
+    takes the user's row lock, so concurrent writers get versions in commit
+    order. Returns the new version. session defaults to db.session.
+    """
+    session = session or db.session
+    session.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(
+            todos_version=User.todos_version + 1,
+            todos_changed_at=datetime.utcnow(),
+            updated_at=User.updated_at  # not a profile change
+        ),
+        execution_options={'synchronize_session': False}
+    )
+    return session.scalar(select(User.todos_version).where(User.id == user_id))
+
+def get_todos_version(user_id, session=None):
+    """Return (version, changed_at) for the user's todo collection"""
+    row = (session or db.session).execute(
+        select(User.todos_version, User.todos_changed_at).where(User.id == user_id)
+    ).one_or_none()
+    return (row[0], row[1]) if row else (0, None)